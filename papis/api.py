@@ -1,7 +1,7 @@
 """This module describes which functions are intended to be used by users to
 create papis scripts.
 """
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Iterator
 import logging
 
 import papis.utils
@@ -166,6 +166,26 @@ def get_documents_in_lib(
     return papis.database.get(library).query(search)
 
 
+def iter_documents(
+        library: Optional[str] = None,
+        search: str = "") -> Iterator[papis.document.Document]:
+    """Iterate over the documents contained in the given library with
+    possibly a search string, like :func:`get_documents_in_lib`. The
+    documents are yielded as soon as they are found, so that they can
+    be processed without waiting for all of them.
+
+    :param library: Library name.
+    :type  library: str
+
+    :param search: Search string
+    :type  search: str
+
+    :returns: Iterator over the filtered documents.
+
+    """
+    return papis.database.get(library).iter_query(search)
+
+
 def clear_lib_cache(lib: Optional[str] = None) -> None:
     """Clear cache associated with a library. If no library is given
     then the current library is used.
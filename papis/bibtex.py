@@ -5,7 +5,7 @@ import string
 import logging
 import os
 import re
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Iterator
 
 import papis.config
 import click
@@ -55,7 +55,14 @@ bibtex_key_converter = {
 
 
 def exporter(documents: List[papis.document.Document]) -> str:
-    return '\n'.join(to_bibtex(document) for document in documents)
+    return ''.join(iter_exporter(documents))
+
+
+def iter_exporter(
+        documents: Iterable[papis.document.Document]) -> Iterator[str]:
+    """Export documents to bibtex one by one."""
+    for i, document in enumerate(documents):
+        yield ('\n' if i else '') + to_bibtex(document)
 
 
 class Importer(papis.importer.Importer):
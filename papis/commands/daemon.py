@@ -0,0 +1,53 @@
+"""
+This command runs the papis daemon, which keeps the databases of the
+libraries loaded so that other papis commands get their documents
+right away, no matter how big the libraries are.
+See :mod:`papis.daemon` for the details.
+
+- Start the daemon in the foreground
+
+.. code::
+
+    papis daemon
+
+- Stop the running daemon
+
+.. code::
+
+    papis daemon --stop
+
+Cli
+^^^
+.. click:: papis.commands.daemon:cli
+    :prog: papis daemon
+"""
+import logging
+import click
+
+import papis.cli
+import papis.daemon
+
+
+@click.command("daemon")
+@click.help_option('--help', '-h')
+@click.option(
+    "--stop",
+    help="Stop the running daemon",
+    default=False,
+    is_flag=True)
+def cli(stop: bool) -> None:
+    """Serve the databases to other papis commands"""
+    logger = logging.getLogger('cli:daemon')
+    if stop:
+        client = papis.daemon.connect()
+        if client is None:
+            logger.warning("The papis daemon is not running")
+            return
+        client.call('shutdown', None)
+        client.close()
+        return
+
+    try:
+        papis.daemon.serve()
+    except KeyboardInterrupt:
+        pass
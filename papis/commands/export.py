@@ -47,7 +47,9 @@ Cli
 """
 import papis
 import os
+import sys
 import shutil
+import itertools
 import papis.utils
 import papis.document
 import click
@@ -57,7 +59,7 @@ import papis.database
 import papis.strings
 import logging
 import papis.plugin
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 
 logger = logging.getLogger('cli:export')
 
@@ -85,6 +87,31 @@ def run(documents: List[papis.document.Document], to_format: str,) -> str:
     return str(ret_string)
 
 
+def iter_run(
+        documents: Iterable[papis.document.Document],
+        to_format: str) -> Iterator[str]:
+    """
+    Exports several documents into something else, yielding the exported
+    text in chunks while the documents are consumed. Exporters that do
+    not provide an ``iter_exporter`` function next to them are given all
+    the documents at once.
+
+    :param documents: Papis documents
+    :type  documents: iterable
+    :param to_format: what format to use
+    :type  to_format: str
+    """
+    exporter = (
+        papis.plugin.get_extension_manager(_extension_name())[to_format]
+        .plugin)
+    module = sys.modules.get(getattr(exporter, '__module__', ''))
+    iter_exporter = getattr(module, 'iter_exporter', None)
+    if iter_exporter is None:
+        yield run(list(documents), to_format)
+    else:
+        yield from iter_exporter(documents)
+
+
 @click.command("export")
 @click.help_option('--help', '-h')
 @papis.cli.query_option()
@@ -117,6 +144,10 @@ def cli(query: str,
         _all: bool) -> None:
     """Export a document from a given library"""
 
+    if _all and not doc_folder and not sort_field and not folder:
+        _export_stream(query, out, fmt)
+        return
+
     if doc_folder:
         documents = [papis.document.from_folder(doc_folder)]
     else:
@@ -169,6 +200,33 @@ def cli(query: str,
             shutil.copytree(_doc_folder, outdir)
 
 
+def _export_stream(query: str, out: Optional[str], fmt: str) -> None:
+    """Export every document matching the query while the database
+    yields them, without holding all of them in memory."""
+    it = papis.database.get().iter_query(query)
+    first = next(it, None)
+    if first is None:
+        logger.warning(papis.strings.no_documents_retrieved_message)
+        return
+
+    def _with_folder() -> Iterator[papis.document.Document]:
+        for d in itertools.chain([first], it):
+            d["_papis_local_folder"] = d.get_main_folder()
+            yield d
+
+    chunks = iter_run(_with_folder(), to_format=fmt)
+    if out is not None:
+        logger.info("Dumping to {0}".format(out))
+        with open(out, 'a+') as fd:
+            for chunk in chunks:
+                fd.write(chunk)
+    else:
+        logger.info("Dumping to stdout")
+        for chunk in chunks:
+            click.echo(chunk, nl=False)
+        click.echo()
+
+
 @click.command('export')
 @click.pass_context
 @click.help_option('--help', '-h')
@@ -47,6 +47,7 @@ Cli
     :prog: papis list
 """
 
+import itertools
 import logging
 import papis
 import os
@@ -61,13 +62,13 @@ import papis.pick
 import papis.format
 import click
 
-from typing import List, Optional, Union, Sequence
+from typing import Iterable, Iterator, Optional, Union, Sequence
 
 logger = logging.getLogger('list')
 
 
 def run(
-        documents: List[papis.document.Document],
+        documents: Iterable[papis.document.Document],
         libraries: bool = False,
         downloaders: bool = False,
         pick: bool = False,
@@ -83,57 +84,86 @@ def run(
     :returns: List different objects
     :rtype:  list
     """
+    return list(iter_run(
+        documents,
+        libraries=libraries,
+        downloaders=downloaders,
+        pick=pick,
+        files=files,
+        folders=folders,
+        info_files=info_files,
+        notes=notes,
+        fmt=fmt,
+        template=template))
+
+
+def iter_run(
+        documents: Iterable[papis.document.Document],
+        libraries: bool = False,
+        downloaders: bool = False,
+        pick: bool = False,
+        files: bool = False,
+        folders: bool = False,
+        info_files: bool = False,
+        notes: bool = False,
+        fmt: str = "",
+        template: Optional[str] = None
+        ) -> Iterator[Union[str, papis.document.Document]]:
+    """Like :func:`run`, but the objects are yielded one by one as the
+    documents are consumed, so that they can be shown right away.
+
+    :returns: Different objects
+    :rtype:  iterator
+    """
     if downloaders:
-        return [str(d) for d in papis.downloaders.get_available_downloaders()]
+        for downloader in papis.downloaders.get_available_downloaders():
+            yield str(downloader)
+        return
 
     if template is not None:
         if not os.path.exists(template):
             logger.error("Template file {} not found".format(template))
-            return []
+            return
         with open(template) as fd:
             fmt = fd.read()
 
     if libraries:
         config = papis.config.get_configuration()
-        return [
-            section + ' ' + config[section]['dir']
-            for section in config
-            if 'dir' in config[section]]
-
-    if files:
-        return [
-            doc_file for files in [
-                document.get_files() for document in documents
-            ] for doc_file in files
-        ]
-    elif notes:
-        return [
-            os.path.join(d.get_main_folder() or '', d["notes"])
-            for d in documents
-            if d.get_main_folder() is not None
-            and d.has("notes") and isinstance(d["notes"], str)
-            and os.path.exists(
-                        os.path.join(d.get_main_folder() or '', d["notes"]))]
-    elif info_files:
-        return [d.get_info_file() for d in documents]
-    elif fmt:
-        return [
-            papis.format.format(fmt, document)
-            for document in documents
-        ]
-    elif folders:
-        return [
-            str(d.get_main_folder()) for d in documents
-            if d.get_main_folder() is not None
-        ]
-    else:
-        return documents
+        for section in config:
+            if 'dir' in config[section]:
+                yield section + ' ' + config[section]['dir']
+        return
+
+    format_document = papis.format.compile(fmt) if fmt else None
+    for d in documents:
+        if files:
+            yield from d.get_files()
+        elif notes:
+            folder = d.get_main_folder()
+            if (folder is not None
+                    and d.has("notes") and isinstance(d["notes"], str)
+                    and os.path.exists(os.path.join(folder, d["notes"]))):
+                yield os.path.join(folder, d["notes"])
+        elif info_files:
+            yield d.get_info_file()
+        elif format_document is not None:
+            yield format_document(d)
+        elif folders:
+            if d.get_main_folder() is not None:
+                yield str(d.get_main_folder())
+        else:
+            yield d
 
 
 @click.command("list")
 @click.help_option('--help', '-h')
 @papis.cli.query_option()
 @papis.cli.sort_option()
+@click.option(
+    "--limit",
+    help="List only the first LIMIT documents",
+    type=int,
+    default=None)
 @click.option(
     "-i",
     "--info",
@@ -180,11 +210,12 @@ def cli(
         _format: str,
         template: Optional[str], _all: bool, downloaders: bool,
         libraries: bool,
-        sort_field: Optional[str], sort_reverse: bool) -> None:
+        sort_field: Optional[str], sort_reverse: bool,
+        limit: Optional[int]) -> None:
     """List documents' properties"""
 
     logger = logging.getLogger('cli:list')
-    documents = []  # type: List[papis.document.Document]
+    documents = []  # type: Iterable[papis.document.Document]
 
     if (not libraries and not downloaders and
             not _file and not info and not _dir):
@@ -192,17 +223,27 @@ def cli(
 
     if not libraries and not downloaders:
         db = papis.database.get()
-        documents = db.query(query)
-        if sort_field:
-            documents = \
-                papis.document.sort(documents, sort_field, sort_reverse)
-
-        if not documents:
-            logger.warning(papis.strings.no_documents_retrieved_message)
-        if not _all:
-            documents = list(papis.pick.pick_doc(documents))
-
-    objects = run(
+        if _all and not sort_field:
+            # Stream the documents, so that the first ones are listed
+            # while the rest of the library is still being matched
+            it = itertools.islice(db.iter_query(query), limit)
+            first = next(it, None)
+            if first is None:
+                logger.warning(papis.strings.no_documents_retrieved_message)
+            else:
+                documents = itertools.chain([first], it)
+        else:
+            docs = db.query(
+                query, limit=limit, sort_key=sort_field or None,
+                reverse=sort_reverse)
+
+            if not docs:
+                logger.warning(papis.strings.no_documents_retrieved_message)
+            if not _all:
+                docs = list(papis.pick.pick_doc(docs))
+            documents = docs
+
+    objects = iter_run(
         documents,
         libraries=libraries,
         downloaders=downloaders,
@@ -115,12 +115,11 @@ def run(document: Document, opener: Optional[str] = None,
                     raise Exception("No mark header format")
                 if not _mark_name:
                     raise Exception("No mark name format")
+                mark_filter = papis.format.compile(_mark_fmt, key=_mark_name)
                 mark_dict = papis.api.pick(
                     marks,
-                    header_filter=lambda x: papis.format.format(
-                        _mark_fmt, x, key=_mark_name),
-                    match_filter=lambda x: papis.format.format(
-                        _mark_fmt, x, key=_mark_name))
+                    header_filter=mark_filter,
+                    match_filter=mark_filter)
                 if mark_dict:
                     if not _mark_opener:
                         raise Exception("mark-opener-format not set")
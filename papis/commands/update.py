@@ -60,6 +60,8 @@ from typing import List, Dict, Tuple, Optional, Any
 
 
 def _update_with_database(document: papis.document.Document) -> None:
+    # the info file might already hold the data, e.g. if it was edited
+    # outside of papis, but the database might not know it yet
     document.save()
     papis.database.get().update(document)
 
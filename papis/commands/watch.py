@@ -0,0 +1,50 @@
+"""
+This command keeps the database of a library up to date while the info
+files of the library are edited, added, moved or removed, so that other
+papis commands find the changes without clearing the cache or indexing
+the library again.
+
+It uses the ``inotify`` interface of Linux and runs until it is
+interrupted, e.g.
+
+.. code::
+
+    papis watch --delay 2
+
+Cli
+^^^
+.. click:: papis.commands.watch:cli
+    :prog: papis watch
+"""
+import logging
+import click
+
+import papis.cli
+import papis.database
+import papis.database.watch
+
+
+@click.command("watch")
+@click.help_option('--help', '-h')
+@click.option(
+    "--delay",
+    help="Seconds without changes after which they are applied",
+    type=float,
+    default=0.5)
+def cli(delay: float) -> None:
+    """Keep the database up to date with the changes of the library"""
+    logger = logging.getLogger('cli:watch')
+    db = papis.database.get()
+    try:
+        watcher = papis.database.watch.Watcher(db, delay=delay)
+    except OSError as e:
+        logger.error("Cannot watch the library: {0}".format(e))
+        return
+
+    logger.info("Watching {0}".format(", ".join(db.get_dirs())))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -50,6 +50,15 @@ general_settings = {
     "notes-name": "notes.tex",
     "use-cache": True,
     "cache-dir": None,
+    "cache-revalidate": False,
+    "cache-journal-max-size": 4194304,
+    "cache-journal-max-age": 86400,
+    "query-cache-size": 32,
+    "use-daemon": True,
+    "crawl-nested-documents": True,
+    "crawl-ignore": "['.git']",
+    "parallel-executor": "auto",
+    "info-parse-cache": False,
     "use-git": False,
 
     "add-confirm": False,
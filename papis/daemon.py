@@ -0,0 +1,495 @@
+"""
+The papis daemon keeps the databases of the libraries loaded in a
+resident process and answers the requests of other papis processes over
+a Unix socket in the cache directory (see
+:ref:`cache-dir <config-settings-cache-dir>`), so that queries do not
+need to load the cache or open the index of a library every time.
+
+It is started with ``papis daemon``. While it is running,
+:func:`papis.database.get` returns a :class:`RemoteDatabase`, which
+sends every call to the daemon, unless
+:ref:`use-daemon <config-settings-use-daemon>` is ``False``.
+The daemon keeps its databases up to date with
+:class:`papis.database.watch.Watcher` where ``inotify`` is available.
+
+Requests and responses are single lines of JSON. A request has a
+``command``, the ``library`` name and ``paths`` it applies to, a list
+of ``args`` and the ``settings`` of the client in
+:data:`REQUEST_SETTINGS`, and the response has either a ``result`` or an
+``error``. The settings of the client decide which database backend
+answers, which documents match a query and how they are formatted, all
+other settings are those of the daemon.
+Documents are sent as objects with their ``folder`` and ``data``. Dates
+and times, which yaml reads from info files, are sent as tagged objects
+so that they are dates again on the other side, other values that are not
+valid JSON are sent as strings.
+"""
+import contextlib
+import datetime
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import papis.config
+import papis.document
+import papis.format
+import papis.library
+import papis.utils
+import papis.database
+import papis.database.base
+import papis.database.watch
+from typing import Any, Dict, Iterator, List, Optional, Tuple  # noqa: ignore
+
+DatabaseKey = Tuple[str, Tuple[str, ...], str]
+
+#: The daemon needs Unix sockets, which are missing e.g. on Windows
+HAS_UNIX_SOCKETS = (
+    hasattr(socket, 'AF_UNIX') and hasattr(socketserver, 'UnixStreamServer'))
+
+logger = logging.getLogger('daemon')
+
+#: Database methods that can be called through the daemon
+DATABASE_COMMANDS = (
+    'get_backend_name', 'get_all_query_string', 'get_all_documents',
+    'match', 'query', 'query_dict', 'count', 'exists', 'find_by_key',
+    'add', 'update', 'delete', 'add_many', 'update_many', 'clear',
+    'initialize',
+)
+#: Settings of the client that are used for its requests
+REQUEST_SETTINGS = (
+    'database-backend', 'match-format', 'format-doc-name', 'formater',
+)
+
+
+def get_socket_path() -> str:
+    """Get the path of the socket of the daemon, in the cache directory.
+
+    :returns: Full path of the socket
+    :rtype:  str
+    """
+    return os.path.join(papis.utils.get_cache_home(), 'daemon.sock')
+
+
+def get_request_settings() -> Dict[str, Any]:
+    """Get the settings of this process that are sent with its requests.
+    """
+    return dict((key, papis.config.get(key)) for key in REQUEST_SETTINGS)
+
+
+@contextlib.contextmanager
+def use_settings(section: str, settings: Dict[str, Any]) -> Iterator[None]:
+    """Use some settings in a section of the configuration, e.g. the one
+    of a library, while a request runs, and restore them afterwards.
+
+    :param section: Name of the section
+    :type  section: str
+    :param settings: Values of the settings, None values are ignored
+    :type  settings: dict
+    """
+    config = papis.config.get_configuration()
+    added = not config.has_section(section)
+    if added:
+        config.add_section(section)
+    old = dict()  # type: Dict[str, Optional[str]]
+    for key, value in settings.items():
+        if value is None:
+            continue
+        old[key] = (config.get(section, key, raw=True)
+                    if config.has_option(section, key) else None)
+        config.set(section, key, str(value))
+    if 'formater' in old:
+        papis.format.clear_formater()
+    try:
+        yield
+    finally:
+        if added:
+            config.remove_section(section)
+        else:
+            for key, value in old.items():
+                if value is None:
+                    config.remove_option(section, key)
+                else:
+                    config.set(section, key, value)
+        if 'formater' in old:
+            papis.format.clear_formater()
+
+
+def encode(value: Any) -> Any:
+    """Convert documents and dates into objects that can be sent as JSON.
+
+    >>> encode([datetime.date(2020, 1, 31)])
+    [{'__date__': [2020, 1, 31]}]
+    """
+    if isinstance(value, papis.document.Document):
+        return {'__document__': value.get_main_folder(),
+                'data': encode(papis.document.to_dict(value))}
+    if isinstance(value, datetime.datetime):
+        offset = value.utcoffset()
+        return {'__datetime__': [
+                    value.year, value.month, value.day, value.hour,
+                    value.minute, value.second, value.microsecond],
+                'utcoffset': (None if offset is None
+                              else offset.total_seconds())}
+    if isinstance(value, datetime.date):
+        return {'__date__': [value.year, value.month, value.day]}
+    if isinstance(value, dict):
+        return dict((k, encode(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    return value
+
+
+def decode(value: Any) -> Any:
+    """Convert back the documents and dates of a value received as JSON.
+
+    >>> decode(encode([datetime.date(2020, 1, 31)]))
+    [datetime.date(2020, 1, 31)]
+    """
+    if isinstance(value, dict):
+        if '__document__' in value:
+            document = papis.document.from_data(decode(value['data']))
+            if value['__document__'] is not None:
+                document.set_folder(value['__document__'])
+            return document
+        if '__date__' in value:
+            return datetime.date(*value['__date__'])
+        if '__datetime__' in value:
+            tzinfo = None  # type: Optional[datetime.tzinfo]
+            if value['utcoffset'] is not None:
+                tzinfo = datetime.timezone(
+                    datetime.timedelta(seconds=value['utcoffset']))
+            return datetime.datetime(
+                *value['__datetime__']).replace(tzinfo=tzinfo)
+        return dict((k, decode(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    """Answer the requests of a connection, one per line."""
+
+    def handle(self) -> None:
+        server = self.server
+        assert isinstance(server, Server)
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+                response = {'result': encode(server.execute(request))}
+            except Exception as e:
+                logger.debug("Request failed", exc_info=True)
+                response = {'error': '{0}: {1}'.format(
+                    type(e).__name__, e)}
+            self.wfile.write(
+                json.dumps(response, default=str).encode() + b'\n')
+            self.wfile.flush()
+
+
+if HAS_UNIX_SOCKETS:
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+        """Unix socket server holding the databases of the libraries.
+
+        :param path: Path of the socket
+        :type  path: str
+        """
+
+        daemon_threads = True
+
+        def __init__(self, path: str) -> None:
+            self.path = path
+            # requests of all connections run one at a time, the databases
+            # are not meant to be used by several threads at once
+            self.lock = threading.RLock()
+            self.databases = dict(
+            )  # type: Dict[DatabaseKey, papis.database.base.Database]
+            self.watchers = []  # type: List[Any]
+            # this process serves the databases, it should not use itself
+            papis.config.set('use-daemon', False)
+            if os.path.exists(path):
+                os.remove(path)
+            umask = os.umask(0o177)
+            try:
+                super().__init__(path, Handler)
+            finally:
+                os.umask(umask)
+
+        def get_database(
+                self, name: str,
+                paths: List[str]) -> papis.database.base.Database:
+            """Get the database of a library, loading and watching it the
+            first time that it is requested.
+            """
+            backend = papis.config.get('database-backend') or 'papis'
+            key = (name, tuple(paths), backend)
+            try:
+                return self.databases[key]
+            except KeyError:
+                pass
+            library = papis.library.Library(name, paths)
+            database = papis.database._instantiate_database(backend, library)
+            database.get_all_documents()
+            self.databases[key] = database
+            try:
+                watcher = papis.database.watch.Watcher(database)
+            except OSError as e:
+                logger.warning(
+                    "Changes to '{0}' made outside of papis will not be "
+                    "seen: {1}"
+                    .format(name, e))
+            else:
+                watcher.lock = self.lock
+                watcher.start()
+                self.watchers.append(watcher)
+            logger.info("Serving library '{0}'".format(name))
+            return database
+
+        def execute(self, request: Dict[str, Any]) -> Any:
+            """Run a request and return its result."""
+            command = request['command']
+            args = decode(request.get('args', []))
+            if command == 'ping':
+                return os.getpid()
+            if command == 'shutdown':
+                threading.Thread(target=self.shutdown).start()
+                return None
+            with self.lock, use_settings(
+                    request['library'], request.get('settings', dict())):
+                database = self.get_database(
+                    request['library'], request['paths'])
+                if command == 'format':
+                    fmt, query_string = args
+                    return list(map(papis.format.compile(fmt),
+                                    database.query(query_string)))
+                if command not in DATABASE_COMMANDS:
+                    raise ValueError("Unknown command '{0}'".format(command))
+                if command in ('add', 'delete'):
+                    return self.apply(database, command, args[:1])
+                if command == 'add_many':
+                    return self.apply(database, command, args[0])
+                return getattr(database, command)(*args)
+
+        def apply(
+                self, database: papis.database.base.Database,
+                command: str,
+                documents: List[papis.document.Document]) -> None:
+            """Add or delete documents that the watcher of the database may
+            have already added or deleted, so that adding a known document
+            updates it and deleting an unknown document does nothing.
+            """
+            folders = set(
+                str(doc.get_main_folder())
+                for doc in database.get_all_documents())
+            known = [doc for doc in documents
+                     if str(doc.get_main_folder()) in folders]
+            if command == 'delete':
+                for doc in known:
+                    database.delete(doc)
+                return
+            added = [doc for doc in documents
+                     if str(doc.get_main_folder()) not in folders]
+            if added:
+                database.add_many(added)
+            if known:
+                database.update_many(known)
+
+        def server_close(self) -> None:
+            for watcher in self.watchers:
+                watcher.close()
+            super().server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def serve(path: Optional[str] = None) -> None:
+    """Run the daemon until it is shut down.
+
+    :param path: Path of the socket, by default :func:`get_socket_path`
+    :type  path: str
+    """
+    if not HAS_UNIX_SOCKETS:
+        raise Exception("The papis daemon needs Unix sockets, which are not "
+                        "available on this platform")
+    path = path or get_socket_path()
+    client = connect(path)
+    if client is not None:
+        client.close()
+        raise Exception("The papis daemon is already running")
+    server = Server(path)
+    server.get_database(
+        papis.config.get_lib_name(), papis.config.get_lib().paths)
+    logger.info("Listening on {0}".format(path))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class Client:
+
+    """Connection to the daemon.
+
+    :param path: Path of the socket
+    :type  path: str
+    :raises OSError: If the daemon is not running
+    """
+
+    def __init__(self, path: str) -> None:
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(path)
+        except OSError:
+            self.socket.close()
+            raise
+        self.file = self.socket.makefile('rwb')
+
+    def call(self, command: str, library: Optional[papis.library.Library],
+             *args: Any) -> Any:
+        """Send a request to the daemon and wait for its result.
+
+        :raises OSError: If the connection is lost
+        :raises Exception: If the request failed in the daemon
+        """
+        request = {'command': command, 'args': encode(list(args))}
+        if library is not None:
+            request['library'] = library.name
+            request['paths'] = library.paths
+            request['settings'] = get_request_settings()
+        self.file.write(json.dumps(request, default=str).encode() + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The papis daemon closed the connection")
+        response = json.loads(line.decode())
+        if 'error' in response:
+            raise Exception(response['error'])
+        return decode(response['result'])
+
+    def close(self) -> None:
+        try:
+            self.file.close()
+        except OSError:
+            # unsent data of a lost connection
+            pass
+        self.socket.close()
+
+
+def connect(path: Optional[str] = None) -> Optional[Client]:
+    """Connect to the daemon if it is running.
+
+    :param path: Path of the socket, by default :func:`get_socket_path`
+    :type  path: str
+    :returns: A client or None
+    """
+    path = path or get_socket_path()
+    if not HAS_UNIX_SOCKETS or not os.path.exists(path):
+        return None
+    try:
+        return Client(path)
+    except OSError:
+        return None
+
+
+class RemoteDatabase(papis.database.base.Database):
+
+    """Database whose calls are answered by the daemon. If the daemon
+    stops, the calls fall back to a database of this process.
+    """
+
+    def __init__(self, client: Client,
+                 library: Optional[papis.library.Library] = None):
+        papis.database.base.Database.__init__(self, library)
+        self.client = client
+        self.local = None  # type: Optional[papis.database.base.Database]
+        self.all_query_string = None  # type: Optional[str]
+
+    def _call(self, command: str, *args: Any) -> Any:
+        if self.local is None:
+            try:
+                return self.client.call(command, self.lib, *args)
+            except OSError as e:
+                logger.warning(
+                    "Lost the papis daemon, continuing without it: {0}"
+                    .format(e))
+                self.client.close()
+                backend = papis.config.get('database-backend') or 'papis'
+                self.local = papis.database._instantiate_database(
+                    backend, self.lib)
+        return getattr(self.local, command)(*args)
+
+    def format(self, fmt: str, query_string: str) -> List[str]:
+        """Format the documents matching a query in the daemon."""
+        if self.local is not None:
+            return list(map(papis.format.compile(fmt),
+                            self.local.query(query_string)))
+        try:
+            return list(
+                self.client.call('format', self.lib, fmt, query_string))
+        except OSError:
+            return list(map(papis.format.compile(fmt),
+                            self.query(query_string)))
+
+    def initialize(self) -> None:
+        self._call('initialize')
+
+    def get_backend_name(self) -> str:
+        return str(self._call('get_backend_name'))
+
+    def clear(self) -> None:
+        self._call('clear')
+
+    def add(self, document: papis.document.Document) -> None:
+        self._call('add', document)
+
+    def update(self, document: papis.document.Document) -> None:
+        self._call('update', document)
+
+    def delete(self, document: papis.document.Document) -> None:
+        self._call('delete', document)
+
+    def add_many(self, documents: List[papis.document.Document]) -> None:
+        self._call('add_many', documents)
+
+    def update_many(self, documents: List[papis.document.Document]) -> None:
+        self._call('update_many', documents)
+
+    def match(
+            self, document: papis.document.Document,
+            query_string: str) -> bool:
+        return bool(self._call('match', document, query_string))
+
+    def query(
+            self,
+            query_string: str,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            sort_key: Optional[str] = None,
+            reverse: bool = False) -> List[papis.document.Document]:
+        return list(self._call(
+            'query', query_string, limit, offset, sort_key, reverse))
+
+    def query_dict(
+            self, query: Dict[str, str]) -> List[papis.document.Document]:
+        return list(self._call('query_dict', query))
+
+    def count(self, query_string: str) -> int:
+        return int(self._call('count', query_string))
+
+    def exists(self, query_string: str) -> bool:
+        return bool(self._call('exists', query_string))
+
+    def find_by_key(
+            self, key: str, value: Any) -> List[papis.document.Document]:
+        return list(self._call('find_by_key', key, value))
+
+    def get_all_query_string(self) -> str:
+        if self.all_query_string is None:
+            self.all_query_string = str(self._call('get_all_query_string'))
+        return self.all_query_string
+
+    def get_all_documents(self) -> List[papis.document.Document]:
+        return list(self._call('get_all_documents'))
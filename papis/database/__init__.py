@@ -18,11 +18,28 @@ def get(library_name: Optional[str] = None) -> Database:
     try:
         database = DATABASES[library]
     except KeyError:
-        database = _instantiate_database(backend, library)
+        database = _connect_daemon(library) or _instantiate_database(
+            backend, library)
         DATABASES[library] = database
     return database
 
 
+def _connect_daemon(library: Library) -> Optional[Database]:
+    import papis.config
+    if not papis.config.getboolean('use-daemon'):
+        return None
+    # the daemon is only reachable through a Unix socket
+    import socket
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    import papis.daemon
+    client = papis.daemon.connect()
+    if client is None:
+        return None
+    logger.debug("Using the papis daemon")
+    return papis.daemon.RemoteDatabase(client, library)
+
+
 def _instantiate_database(backend_name: str, library: Library) -> Database:
     if backend_name == "papis":
         import papis.database.cache
@@ -30,6 +47,9 @@ def _instantiate_database(backend_name: str, library: Library) -> Database:
     elif backend_name == "whoosh":
         import papis.database.whoosh
         return papis.database.whoosh.Database(library)
+    elif backend_name == "sqlite":
+        import papis.database.sqlite
+        return papis.database.sqlite.Database(library)
     else:
         raise Exception('No valid database type: {}'.format(backend_name))
 
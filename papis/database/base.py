@@ -2,14 +2,74 @@
 Here the database abstraction for the libraries is defined.
 """
 
+import heapq
+import collections
+
 import papis.utils
 import papis.config
 import papis.library
 import papis.document
 
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any, Tuple, Iterator
 from abc import ABC, abstractmethod
 
+QueryCacheKey = Tuple[Any, ...]
+QueryResults = List[papis.document.Document]
+
+
+def normalize_key_value(value: Any) -> str:
+    """Normalize the value of a document key so that it can be compared
+    exactly against other values, e.g. for the ``unique-document-keys``.
+
+    :param value: Value of a document key
+    :returns: Normalized value
+
+    >>> normalize_key_value(' 10.1021/CT5004252 ')
+    '10.1021/ct5004252'
+    """
+    return str(value).strip().lower()
+
+
+def select_documents(
+        documents: List[papis.document.Document],
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort_key: Optional[str] = None,
+        reverse: bool = False) -> List[papis.document.Document]:
+    """Select a page of documents, sorted by a key if one is given.
+    Only the documents in the page and the ones before it are sorted,
+    by means of :func:`heapq.nsmallest`, so that selecting the first
+    few documents of a big list is cheap. The order is the one given by
+    :func:`papis.document.sort`.
+
+    :param documents: Documents to select from
+    :param limit: Maximum number of documents to select, all if None
+    :param offset: Number of documents to skip
+    :param sort_key: Key of the documents to sort them by
+    :param reverse: Sort the documents in reverse order
+    :returns: Selected documents
+
+    >>> docs = [papis.document.from_data({'year': y})
+    ...         for y in [2001, 1999, 2010, 2005]]
+    >>> [d['year'] for d in select_documents(docs, limit=2, sort_key='year')]
+    [1999, 2001]
+    >>> [d['year'] for d in select_documents(
+    ...     docs, limit=2, offset=1, sort_key='year', reverse=True)]
+    [2005, 2001]
+    >>> [d['year'] for d in select_documents(docs, offset=3)]
+    [2005]
+    """
+    if sort_key is None:
+        if limit is None:
+            return documents[offset:] if offset else documents
+        return documents[offset:offset + limit]
+    if limit is None:
+        return papis.document.sort(documents, sort_key, reverse)[offset:]
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    return select(
+        offset + limit, documents,
+        key=papis.document.get_sort_key(sort_key, reverse))[offset:]
+
 
 class Database(ABC):
     """Abstract class for the database backends
@@ -18,6 +78,11 @@ class Database(ABC):
     def __init__(self, library: Optional[papis.library.Library] = None):
         self.lib = library or papis.config.get_lib()
         assert(isinstance(self.lib, papis.library.Library))
+        # Results of the latest queries, valid while the generation
+        # does not change, see get_cached_query
+        self.generation = 0
+        self.query_cache = collections.OrderedDict(
+        )  # type: collections.OrderedDict[QueryCacheKey, QueryResults]
 
     @abstractmethod
     def initialize(self) -> None:
@@ -66,15 +131,172 @@ class Database(ABC):
     def delete(self, document: papis.document.Document) -> None:
         ...
 
+    def add_many(self, documents: List[papis.document.Document]) -> None:
+        """Add several documents at once. By default they are added one by
+        one, backends are encouraged to override this so that all
+        documents are written together.
+
+        :param documents: Documents to be added
+        """
+        for document in documents:
+            self.add(document)
+
+    def update_many(self, documents: List[papis.document.Document]) -> None:
+        """Update several documents at once, see :meth:`add_many`.
+
+        :param documents: Documents to be updated
+        """
+        for document in documents:
+            self.update(document)
+
     @abstractmethod
-    def query(self, query_string: str) -> List[papis.document.Document]:
+    def query(
+            self,
+            query_string: str,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            sort_key: Optional[str] = None,
+            reverse: bool = False) -> List[papis.document.Document]:
+        """Find the documents matching a query.
+
+        :param query_string: Query string
+        :type  query_string: str
+        :param limit: Maximum number of documents to return, all if None
+        :param offset: Number of matching documents to skip
+        :param sort_key: Key of the documents to sort them by before
+            selecting them, see :func:`select_documents`. Otherwise they
+            are in the order given by the backend.
+        :param reverse: Sort the documents in reverse order
+        :returns: List of documents
+        """
         ...
 
+    def iter_query(
+            self, query_string: str) -> Iterator[papis.document.Document]:
+        """Iterate over the documents matching a query. By default the
+        results of :meth:`query` are iterated over, backends are encouraged
+        to yield the documents as soon as they are found instead.
+
+        :param query_string: Query string
+        :type  query_string: str
+        :returns: Iterator over the documents
+        """
+        for document in self.query(query_string):
+            yield document
+
+    def count(self, query_string: str) -> int:
+        """Count the documents matching a query. By default the documents
+        of :meth:`iter_query` are counted, backends are encouraged to count
+        them from their indexes without building any document.
+
+        :param query_string: Query string
+        :type  query_string: str
+        :returns: Number of matching documents
+        """
+        key = self.get_query_cache_key(query_string)
+        documents = self.get_cached_query(key)
+        if documents is not None:
+            return len(documents)
+        return sum(1 for _ in self.iter_query(query_string))
+
+    def exists(self, query_string: str) -> bool:
+        """Check whether any document matches a query, stopping at the
+        first match.
+
+        :param query_string: Query string
+        :type  query_string: str
+        :returns: True if some document matches
+        """
+        key = self.get_query_cache_key(query_string)
+        documents = self.get_cached_query(key)
+        if documents is not None:
+            return bool(documents)
+        return next(self.iter_query(query_string), None) is not None
+
     @abstractmethod
     def query_dict(
             self, query: Dict[str, str]) -> List[papis.document.Document]:
         ...
 
+    def find_by_key(
+            self, key: str, value: Any) -> List[papis.document.Document]:
+        """Find the documents whose ``key`` is exactly ``value``, where
+        case and surrounding whitespace are ignored. This is meant for
+        looking up keys like the ``doi`` which identify documents.
+
+        Backends are encouraged to override this with an index lookup,
+        by default a query is issued and its results are filtered.
+
+        :param key: Key of the documents, e.g. ``doi``
+        :type  key: str
+        :param value: Value that the key should have
+        :returns: List of documents
+        """
+        normalized = normalize_key_value(value)
+        return [
+            d for d in self.query_dict({key: str(value)})
+            if d.has(key) and normalize_key_value(d[key]) == normalized]
+
+    def get_generation(self) -> Tuple[int, ...]:
+        """Get the generation of the library, which changes every time that
+        documents are added, updated or deleted. Backends whose data can be
+        changed by other processes should also include a generation of
+        their storage.
+
+        :returns: Generation
+        """
+        return (self.generation,)
+
+    def bump_generation(self) -> None:
+        """Mark that documents have been added, updated or deleted, so that
+        the results of previous queries are not used anymore.
+        """
+        self.generation += 1
+        self.query_cache.clear()
+
+    def get_query_cache_key(self, query_string: str) -> QueryCacheKey:
+        """Get the key under which the results of a query are cached. It
+        contains the query, with all whitespace collapsed, together with the
+        settings determining how documents are matched and the generation.
+
+        :param query_string: Query string
+        :type  query_string: str
+        :returns: Key of the query
+        """
+        return (
+            " ".join(query_string.split()),
+            papis.config.getstring('formater'),
+            papis.config.getstring('format-doc-name'),
+            papis.config.getstring('match-format'),
+            self.get_generation())
+
+    def get_cached_query(self, key: QueryCacheKey) -> Optional[QueryResults]:
+        """Get the cached results of a query, see :meth:`cache_query`.
+
+        :param key: Key of the query from :meth:`get_query_cache_key`
+        :returns: Documents or None if the query is not cached
+        """
+        try:
+            documents = self.query_cache[key]
+        except KeyError:
+            return None
+        self.query_cache.move_to_end(key)
+        return list(documents)
+
+    def cache_query(self, key: QueryCacheKey, documents: QueryResults) -> None:
+        """Keep the results of a query, dropping the least recently used
+        results if there are more than ``query-cache-size`` queries.
+
+        :param key: Key of the query from :meth:`get_query_cache_key`
+        :param documents: Results of the query
+        """
+        size = papis.config.getint('query-cache-size') or 0
+        if size <= 0:
+            return
+        self.query_cache[key] = list(documents)
+        while len(self.query_cache) > size:
+            self.query_cache.popitem(last=False)
+
     @abstractmethod
     def get_all_documents(self) -> List[papis.document.Document]:
         ...
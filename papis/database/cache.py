@@ -1,4 +1,5 @@
 import pickle
+import itertools
 import logging
 import os
 import papis.utils
@@ -7,12 +8,39 @@ import papis.document
 import papis.config
 import papis.format
 import papis.database.base
+import papis.parallel
+from papis.database.base import select_documents
 import re
+import array
+import atexit
+import weakref
 import multiprocessing
+import concurrent.futures
 import time
-import sys
-from typing import List, Optional, Match, Dict, Tuple
+from typing import (
+    List, Optional, Match, Dict, Tuple, Any, Sequence, Set, Iterator)
 
+try:
+    from multiprocessing import shared_memory
+    HAS_SHARED_MEMORY = True
+except ImportError:  # python < 3.8
+    HAS_SHARED_MEMORY = False
+
+StatType = Tuple[int, int, int]
+JournalRecord = Tuple[
+    str, str, Optional[papis.document.Document], Optional[StatType]]
+#: Version of the layout of the pickled cache files
+CACHE_FORMAT_VERSION = 2
+#: Below this number of documents matching is done without the worker pool
+MIN_PARALLEL_MATCH = 5000
+#: The trigram index is only built for libraries with at least this number
+#: of documents, and only after this number of general queries have
+#: been matched by scanning all documents in the same process
+TRIGRAM_INDEX_MIN_DOCUMENTS = 10000
+TRIGRAM_INDEX_MIN_QUERIES = 20
+
+_LIVE_SHARED_STRINGS = weakref.WeakSet(
+)  # type: weakref.WeakSet[SharedStrings]
 
 logger = logging.getLogger("cache")
 
@@ -54,6 +82,290 @@ def get_cache_file_path(directory: str) -> str:
     return os.path.join(folder, cache_name)
 
 
+def get_journal_file_path(cache_path: str) -> str:
+    """Get the path of the journal file belonging to a cache file.
+
+    :param cache_path: Path of the cache file
+    :type  cache_path: str
+
+    >>> get_journal_file_path('/tmp/a566b2bebc62611dff4cdaceac1a7bbd-papers')
+    '/tmp/a566b2bebc62611dff4cdaceac1a7bbd-papers.journal'
+    """
+    return cache_path + ".journal"
+
+
+def get_info_file_stat(folder: str) -> Optional[StatType]:
+    """Get a cheap fingerprint of the info file of a document folder,
+    namely the modification time (in nanoseconds), the size and the inode
+    of the info file.
+
+    :param folder: Document folder
+    :type  folder: str
+    :returns: Tuple with the fingerprint or None if the info file does not
+        exist.
+
+    >>> import tempfile
+    >>> get_info_file_stat(tempfile.mkdtemp()) is None
+    True
+    """
+    info = os.path.join(folder, papis.config.getstring('info-name'))
+    try:
+        stat = os.stat(info)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def get_pool() -> concurrent.futures.Executor:
+    """Get the executor used to match documents, see :mod:`papis.parallel`.
+    It is started the first time it is needed and then reused by every
+    query of the process.
+
+    :returns: Executor
+    """
+    kind = papis.parallel.get_executor_kind()
+    return papis.parallel.get_executor(
+        'process' if kind == 'serial' else kind)
+
+
+def _shutdown() -> None:
+    # a forked process must not unlink the shared memory of its parent
+    for strings in list(_LIVE_SHARED_STRINGS):
+        if strings.pid == os.getpid():
+            strings.close()
+
+
+atexit.register(_shutdown)
+
+
+class SharedStrings:
+    """A list of strings packed into shared memory, so that the workers
+    of the pool can read them without any serialization.
+
+    The strings are encoded in utf-8 and stored one after the other
+    separated by null characters in the ``data`` buffer, and the
+    ``offsets`` buffer is an array with the position where every string
+    starts, followed by the size of the data.
+
+    >>> strings = SharedStrings(['einstein', 'heisenberg', 'bohr'])
+    >>> match_shared_strings(strings, get_regex_from_search('r'))
+    [1, 2]
+    >>> strings.close()
+    """
+
+    def __init__(self, strings: Sequence[str]) -> None:
+        encoded = [s.replace("\0", "").encode() for s in strings]
+        offsets = array.array("q", [0])
+        for value in encoded:
+            offsets.append(offsets[-1] + len(value) + 1)
+        data = b"\0".join(encoded)
+
+        self.size = len(strings)
+        self.data = shared_memory.SharedMemory(
+            create=True, size=max(1, len(data)))
+        _get_buffer(self.data)[:len(data)] = data
+        offsets_bytes = offsets.tobytes()
+        self.offsets = shared_memory.SharedMemory(
+            create=True, size=len(offsets_bytes))
+        _get_buffer(self.offsets)[:len(offsets_bytes)] = offsets_bytes
+        self.pid = os.getpid()
+        _LIVE_SHARED_STRINGS.add(self)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def close(self) -> None:
+        """Release the shared memory, the strings can not be used anymore
+        afterwards.
+        """
+        _LIVE_SHARED_STRINGS.discard(self)
+        for shm in [self.data, self.offsets]:
+            shm.close()
+            shm.unlink()
+
+
+def _get_buffer(shm: "shared_memory.SharedMemory") -> memoryview:
+    buf = shm.buf
+    assert buf is not None
+    return buf
+
+
+def _match_strings(
+        args: Tuple[Sequence[str], int, str]) -> List[int]:
+    strings, start, regex = args
+    pattern = re.compile(regex, re.IGNORECASE)
+    return [start + i for i, s in enumerate(strings) if pattern.match(s)]
+
+
+def _match_shared_strings(args: Tuple[str, str, int, int, str]) -> List[int]:
+    data_name, offsets_name, start, stop, regex = args
+    data = shared_memory.SharedMemory(name=data_name)
+    offsets = shared_memory.SharedMemory(name=offsets_name)
+    try:
+        with _get_buffer(offsets).cast("q") as index:
+            begin, end = index[start], index[stop] - 1
+        chunk = bytes(_get_buffer(data)[begin:end]).decode()
+    finally:
+        data.close()
+        offsets.close()
+    return _match_strings((chunk.split("\0"), start, regex))
+
+
+def _get_slices(size: int) -> List[Tuple[int, int]]:
+    step = max(1, -(-size // (2 * multiprocessing.cpu_count())))
+    return [(i, min(i + step, size)) for i in range(0, size, step)]
+
+
+def match_shared_strings(strings: SharedStrings, regex: str) -> List[int]:
+    """Match strings stored in shared memory against a regular expression
+    using the worker pool, ignoring the case.
+
+    :param strings: Shared strings
+    :type  strings: SharedStrings
+    :param regex: Regular expression
+    :type  regex: str
+    :returns: Sorted indices of the strings that match
+    """
+    tasks = [
+        (strings.data.name, strings.offsets.name, start, stop, regex)
+        for start, stop in _get_slices(len(strings))]
+    return sum(list(get_pool().map(_match_shared_strings, tasks)), [])
+
+
+def use_pool(size: int) -> bool:
+    """Whether matching a given number of strings is worth distributing
+    the work on the worker pool.
+
+    :param size: Number of strings to be matched
+    :type  size: int
+    """
+    return papis.parallel.get_executor_kind(
+        size, MIN_PARALLEL_MATCH) != 'serial'
+
+
+def match_strings(strings: Sequence[str], regex: str) -> List[int]:
+    """Match strings against a regular expression, ignoring the case.
+    For big lists of strings the work is distributed on the worker pool.
+
+    :param strings: Strings to be matched
+    :type  strings: list
+    :param regex: Regular expression
+    :type  regex: str
+    :returns: Sorted indices of the strings that match
+
+    >>> match_strings(['einstein', 'heisenberg', 'bohr'], '.*o.*')
+    [2]
+    """
+    if not use_pool(len(strings)):
+        return _match_strings((strings, 0, regex))
+    if not HAS_SHARED_MEMORY:
+        tasks = [
+            (strings[start:stop], start, regex)
+            for start, stop in _get_slices(len(strings))]
+        return sum(list(get_pool().map(_match_strings, tasks)), [])
+    shared = SharedStrings(strings)
+    try:
+        return match_shared_strings(shared, regex)
+    finally:
+        shared.close()
+
+
+def get_trigrams(string: str) -> Set[str]:
+    """Get the set of all substrings of three characters of a string.
+
+    >>> sorted(get_trigrams('einstein'))
+    ['ein', 'ins', 'nst', 'ste', 'tei']
+    """
+    return {string[i:i + 3] for i in range(len(string) - 2)}
+
+
+class TrigramIndex:
+    """Index of the substrings of three characters of some strings, which
+    narrows the strings that can contain all the tokens of a search down
+    to a few candidates. These still have to be matched against the
+    regular expression of the search, since the order of the tokens is
+    not taken into account.
+
+    The strings are expected to be in lower case and are identified by
+    the folder of their document.
+
+    >>> index = TrigramIndex()
+    >>> index.add('/a', 'einstein relativity')
+    >>> index.add('/b', 'heisenberg uncertainty relation')
+    >>> sorted(index.get_candidates('STEIN'))
+    ['/a']
+    >>> sorted(index.get_candidates('rel ty'))
+    ['/a', '/b']
+    >>> index.get_candidates('ty') is None
+    True
+    >>> index.remove('/a')
+    >>> sorted(index.get_candidates('rel'))
+    ['/b']
+    """
+
+    def __init__(self) -> None:
+        self.postings = dict()  # type: Dict[str, Set[str]]
+        self.strings = dict()  # type: Dict[str, str]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def add(self, folder: str, string: str) -> None:
+        self.remove(folder)
+        self.strings[folder] = string
+        for trigram in get_trigrams(string):
+            try:
+                self.postings[trigram].add(folder)
+            except KeyError:
+                self.postings[trigram] = {folder}
+
+    def remove(self, folder: str) -> None:
+        string = self.strings.pop(folder, None)
+        if string is None:
+            return
+        for trigram in get_trigrams(string):
+            folders = self.postings[trigram]
+            folders.discard(folder)
+            if not folders:
+                del self.postings[trigram]
+
+    def get_candidates(self, search: str) -> Optional[Set[str]]:
+        """Get the folders whose strings contain all trigrams of the tokens
+        of a search string.
+
+        :param search: Search string as in :func:`get_regex_from_search`
+        :type  search: str
+        :returns: Set of folders or None if the search has no token of at
+            least three characters and therefore can not be narrowed down.
+        """
+        trigrams = set()  # type: Set[str]
+        for token in search.lower().split():
+            trigrams.update(get_trigrams(token))
+        if not trigrams:
+            return None
+        postings = []
+        for trigram in trigrams:
+            folders = self.postings.get(trigram)
+            if not folders:
+                return set()
+            postings.append(folders)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+
+def get_match_signature() -> Tuple[str, str, str]:
+    """Get the settings that the strings that documents are matched against
+    depend on. Whenever any of these settings changes, the cached match
+    strings of the documents are rendered again.
+
+    :returns: Tuple with the settings
+    """
+    return (
+        papis.config.getstring('formater'),
+        papis.config.getstring('format-doc-name'),
+        str(papis.config.get('match-format')))
+
+
 def filter_documents(
         documents: List[papis.document.Document],
         search: str = "") -> List[papis.document.Document]:
@@ -76,33 +388,19 @@ def filter_documents(
 
     """
     logger = logging.getLogger('filter')
-    papis.docmatcher.DocMatcher.set_search(search)
-    papis.docmatcher.DocMatcher.parse()
-    papis.docmatcher.DocMatcher.set_matcher(match_document)
     begin_t = 1000 * time.time()
-    # FIXME: find a better solution for this that works for both OSes
-    if sys.platform == "win32":
-        logger.debug(
-            "Filtering {0} docs (search {1})".format(
-                len(documents), search))
+    logger.debug(
+        "Filtering {0} docs (search {1})".format(len(documents), search))
+    query = papis.docmatcher.compile_query(search)
+
+    filtered_docs = documents if query.clauses else []
+    for clause in query.clauses:
+        strings = [clause.get_string(d) for d in filtered_docs]
         filtered_docs = [
-            d for d in [papis.docmatcher.DocMatcher.return_if_match(d)
-                        for d in documents] if d is not None]
-
-    else:
-        # Doing this multiprocessing in filtering does not seem
-        # to help much, I don't know if it's because I'm doing something
-        # wrong or it is really like this.
-        np = multiprocessing.cpu_count()
-        pool = multiprocessing.Pool(np)
-        logger.debug(
-            "Filtering {0} docs (search {1}) using {2} cores".format(
-                len(documents), search, np))
-        result = pool.map(papis.docmatcher.DocMatcher.return_if_match,
-                          documents)
-        pool.close()
-        pool.join()
-        filtered_docs = [d for d in result if d is not None]
+            filtered_docs[i] for i in match_strings(strings, clause.regex)]
+        if not filtered_docs:
+            break
+
     _delta = 1000 * time.time() - begin_t
     logger.debug("done ({0} ms) ({1} docs)".format(_delta, len(filtered_docs)))
     return filtered_docs
@@ -139,21 +437,7 @@ def match_document(
     return re.match(regex, match_string, re.IGNORECASE)
 
 
-def get_regex_from_search(search: str) -> str:
-    r"""Creates a default regex from a search string.
-
-    :param search: A valid search string
-    :type  search: str
-    :returns: Regular expression
-    :rtype: str
-
-    >>> get_regex_from_search(' ein 192     photon')
-    '.*ein.*192.*photon.*'
-
-    >>> get_regex_from_search('{1234}')
-    '.*\\{1234\\}.*'
-    """
-    return ".*" + ".*".join(map(re.escape, search.split())) + ".*"
+get_regex_from_search = papis.docmatcher.get_regex_from_search
 
 
 class Database(papis.database.base.Database):
@@ -162,6 +446,31 @@ class Database(papis.database.base.Database):
         papis.database.base.Database.__init__(self, library)
         self.logger = logging.getLogger('db:cache')
         self.documents = None  # type: Optional[List[papis.document.Document]]
+        self.stats = dict()  # type: Dict[str, Optional[StatType]]
+        # Position of every document in self.documents by its main folder
+        self.folder_index = dict()  # type: Dict[Optional[str], int]
+        # Folders of the documents by the exact value of the
+        # unique-document-keys, e.g. key_index['doi']['10.1112/x'] = [...]
+        self.key_index = dict()  # type: Dict[str, Dict[str, List[str]]]
+        # Values under which every folder is stored in the key_index
+        self.indexed_values = dict()  # type: Dict[str, Dict[str, str]]
+        # Lower case strings that queries are matched against, rendered
+        # with the settings in match_signature. match_strings holds the
+        # match-format of every folder and field_strings the single keys
+        self.match_signature = None  # type: Optional[Tuple[str, str, str]]
+        self.match_strings = dict()  # type: Dict[str, str]
+        self.field_strings = dict()  # type: Dict[str, Dict[str, str]]
+        # The same strings in the order of the documents, by key, where
+        # the key None stands for the match-format
+        self.columns = dict()  # type: Dict[Optional[str], List[str]]
+        self.shared_columns = dict(
+        )  # type: Dict[Optional[str], SharedStrings]
+        # Trigram index of the match_strings, built once enough general
+        # queries were matched by scanning, and the folders whose strings
+        # have to be added to it again since they changed
+        self.trigram_index = None  # type: Optional[TrigramIndex]
+        self.trigram_pending = set()  # type: Set[str]
+        self.scanned_queries = 0
         self.initialize()
 
     def get_backend_name(self) -> str:
@@ -175,32 +484,88 @@ class Database(papis.database.base.Database):
             return self.documents
         use_cache = papis.config.getboolean("use-cache")
         cache_path = self._get_cache_file_path()
+        loaded = False
         if use_cache and os.path.exists(cache_path):
             self.logger.debug(
                 "Getting documents from cache in {0}".format(cache_path))
             with open(cache_path, 'rb') as fd:
-                self.documents = pickle.load(fd)
-        else:
+                loaded = self._load_snapshot(pickle.load(fd))
+            if loaded:
+                self._replay_journal()
+                if papis.config.getboolean("cache-revalidate"):
+                    self.revalidate()
+        if not loaded:
             self.logger.info('Indexing library, this might take a while')
-            folders = sum([
-                papis.utils.get_folders(d)
-                for d in self.get_dirs()], [])  # type: List[str]
-            self.documents = papis.utils.folders_to_documents(folders)
+            folders = papis.utils.crawl_folders(self.get_dirs())
+            self.stats = {f: get_info_file_stat(f) for f in folders}
+            self._set_documents([
+                papis.document.compact(d)
+                for d in papis.utils.folders_to_documents(folders)])
             if use_cache:
                 self.save()
+        assert self.documents is not None
         self.logger.debug(
             "Loaded documents (%s documents)", len(self.documents))
         return self.documents
 
+    def revalidate(self) -> None:
+        """Bring the cached documents up to date with the library on disk.
+
+        Only the stat information of the info files is compared against the
+        one recorded in the cache, so that only the documents whose info file
+        changed are parsed again. Folders that were added to or removed from
+        the library are also taken into account.
+        """
+        docs = self.get_documents()
+        begin_t = time.time()
+        folders = papis.utils.crawl_folders(self.get_dirs())
+        stats = {f: get_info_file_stat(f) for f in folders}
+
+        removed = set(self.stats) - set(stats)
+        changed = [
+            f for f in folders
+            if f not in self.stats or self.stats[f] != stats[f]]
+        if not removed and not changed:
+            self.logger.debug(
+                "Cache is up to date ({0:.1f} ms)"
+                .format(1000 * (time.time() - begin_t)))
+            return
+
+        self.logger.info(
+            "Revalidating cache ({0} changed, {1} removed)"
+            .format(len(changed), len(removed)))
+        new_docs = {
+            d.get_main_folder(): papis.document.compact(d)
+            for d in papis.utils.folders_to_documents(changed)}
+        documents = [
+            new_docs.pop(d.get_main_folder(), d)
+            for d in docs
+            if d.get_main_folder() not in removed]
+        documents.extend(new_docs.values())
+        for folder in removed.union(changed):
+            self._invalidate_match_strings(folder)
+        self._set_documents(documents)
+        self.stats = stats
+        self.logger.debug(
+            "Revalidated in {0:.1f} ms"
+            .format(1000 * (time.time() - begin_t)))
+        self.save()
+
     def add(self, document: papis.document.Document) -> None:
         docs = self.get_documents()
         self.logger.debug('adding ...')
+        papis.document.compact(document)
         docs.append(document)
         assert(docs[-1].get_main_folder() == document.get_main_folder())
         _folder = document.get_main_folder()
         assert(_folder is not None)
         assert(os.path.exists(_folder))
-        self.save()
+        self.folder_index[_folder] = len(docs) - 1
+        self._index_document(document)
+        self._invalidate_match_strings(_folder)
+        self.stats[_folder] = get_info_file_stat(_folder)
+        self.bump_generation()
+        self._write_journal(("add", _folder, document, self.stats[_folder]))
 
     def update(self, document: papis.document.Document) -> None:
         if not papis.config.getboolean("use-cache"):
@@ -209,8 +574,16 @@ class Database(papis.database.base.Database):
         self.logger.debug('updating document')
         result = self._locate_document(document)
         index = result[0][0]
+        papis.document.compact(document)
         docs[index] = document
-        self.save()
+        _folder = document.get_main_folder()
+        assert _folder is not None
+        self._index_document(document)
+        self._invalidate_match_strings(_folder)
+        self.stats[_folder] = get_info_file_stat(_folder)
+        self.bump_generation()
+        self._write_journal(
+            ("update", _folder, document, self.stats[_folder]))
 
     def delete(self, document: papis.document.Document) -> None:
         if not papis.config.getboolean("use-cache"):
@@ -220,7 +593,15 @@ class Database(papis.database.base.Database):
         result = self._locate_document(document)
         index = result[0][0]
         docs.pop(index)
-        self.save()
+        del self.folder_index[document.get_main_folder()]
+        for d in docs[index:]:
+            self.folder_index[d.get_main_folder()] -= 1
+        _folder = str(document.get_main_folder())
+        self._unindex_document(_folder)
+        self._invalidate_match_strings(_folder)
+        self.stats.pop(_folder, None)
+        self.bump_generation()
+        self._write_journal(("delete", _folder, None, None))
 
     def match(
             self, document: papis.document.Document,
@@ -230,8 +611,24 @@ class Database(papis.database.base.Database):
     def clear(self) -> None:
         cache_path = self._get_cache_file_path()
         self.logger.warning("clearing cache {0}".format(cache_path))
-        if os.path.exists(cache_path):
-            os.remove(cache_path)
+        for path in [cache_path, get_journal_file_path(cache_path)]:
+            if os.path.exists(path):
+                os.remove(path)
+        # a process that keeps the database, like the daemon, has to index
+        # the library again instead of saving the old documents back
+        self.documents = None
+        self.stats = dict()
+        self.folder_index = dict()
+        self.key_index = dict()
+        self.indexed_values = dict()
+        self.match_signature = None
+        self.match_strings = dict()
+        self.field_strings = dict()
+        self._clear_columns()
+        self.trigram_index = None
+        self.trigram_pending = set()
+        self.scanned_queries = 0
+        self.bump_generation()
 
     def query_dict(
             self, dictionary: Dict[str, str]) -> List[papis.document.Document]:
@@ -240,15 +637,245 @@ class Database(papis.database.base.Database):
                 for key, val in dictionary.items()])
         return self.query(query_string)
 
-    def query(self, query_string: str) -> List[papis.document.Document]:
+    def query(
+            self,
+            query_string: str,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            sort_key: Optional[str] = None,
+            reverse: bool = False) -> List[papis.document.Document]:
         self.logger.debug('Querying')
         docs = self.get_documents()
         # This makes it faster, if it's the all query string, return everything
         # without filtering
         if query_string == self.get_all_query_string():
-            return docs
+            return select_documents(docs, limit, offset, sort_key, reverse)
+        key = self.get_query_cache_key(query_string)
+        results = self.get_cached_query(key)
+        if results is None:
+            if limit is not None and sort_key is None:
+                # only the first matches are needed
+                return self._match_first(
+                    query_string, offset + limit)[offset:]
+            results = self._match_all(query_string)
+            self.cache_query(key, results)
+        return select_documents(results, limit, offset, sort_key, reverse)
+
+    def _match_all(self, query_string: str) -> List[papis.document.Document]:
+        docs = self.get_documents()
+        return [docs[i] for i in self._match_indices(query_string)]
+
+    def _match_indices(self, query_string: str) -> List[int]:
+        """Get the positions of the documents matching a query."""
+        docs = self.get_documents()
+        begin_t = 1000 * time.time()
+        indices = None  # type: Optional[List[int]]
+        for clause in papis.docmatcher.compile_query(query_string).clauses:
+            candidates = None  # type: Optional[Set[int]]
+            if clause.key is None:
+                candidates = self._get_trigram_candidates(clause.search)
+            if indices is None and candidates is None:
+                indices = self._match_column(clause.key, clause.regex)
+            else:
+                if candidates is None:
+                    candidates = set(indices or [])
+                elif indices is not None:
+                    candidates.intersection_update(indices)
+                # the candidates are usually few, so match them right here
+                indices = [
+                    i for i in sorted(candidates)
+                    if clause.match_string(
+                        self.get_match_string(docs[i], clause.key))]
+            if not indices:
+                break
+        self.logger.debug(
+            "Matched {0} documents in {1:.1f} ms"
+            .format(len(indices or []), 1000 * time.time() - begin_t))
+        return indices or []
+
+    def count(self, query_string: str) -> int:
+        if query_string == self.get_all_query_string():
+            return len(self.get_documents())
+        results = self.get_cached_query(self.get_query_cache_key(query_string))
+        if results is not None:
+            return len(results)
+        return len(self._match_indices(query_string))
+
+    def exists(self, query_string: str) -> bool:
+        if query_string == self.get_all_query_string():
+            return bool(self.get_documents())
+        return super().exists(query_string)
+
+    def iter_query(
+            self, query_string: str) -> Iterator[papis.document.Document]:
+        docs = list(self.get_documents())
+        if query_string == self.get_all_query_string():
+            results = docs  # type: Optional[List[papis.document.Document]]
         else:
-            return filter_documents(docs, query_string)
+            results = self.get_cached_query(
+                self.get_query_cache_key(query_string))
+        if results is not None:
+            for doc in results:
+                yield doc
+            return
+        clauses = papis.docmatcher.compile_query(query_string).clauses
+        if not clauses:
+            return
+        # the columns that are already built are used, and kept even if
+        # the documents change meanwhile, but missing columns are not built
+        # so that the first documents are yielded right away
+        self._check_match_signature()
+        columns = [self.columns.get(clause.key) for clause in clauses]
+        for i, doc in enumerate(docs):
+            if all(clause.match_string(
+                       self.get_match_string(doc, clause.key)
+                       if column is None else column[i])
+                   for clause, column in zip(clauses, columns)):
+                yield doc
+
+    def _match_first(
+            self,
+            query_string: str,
+            size: int) -> List[papis.document.Document]:
+        """Match the documents in order until ``size`` of them match.
+        """
+        return list(itertools.islice(self.iter_query(query_string), size))
+
+    def get_match_string(
+            self,
+            document: papis.document.Document,
+            key: Optional[str] = None) -> str:
+        """Get the lower case string that a query clause is matched against,
+        i.e., the ``match-format`` of the document for general clauses
+        or the value of a key for clauses like ``author:einstein``.
+        The strings are rendered once and kept in the cache until the
+        document or the settings they depend on change.
+
+        :param document: Papis document
+        :type  document: papis.document.Document
+        :param key: Key of the document or None for the match-format
+        :type  key: str
+        :returns: Rendered string
+        """
+        self._check_match_signature()
+        assert self.match_signature is not None
+        folder = document.get_main_folder()
+        if key is None:
+            strings = self.match_strings
+            sformat = self.match_signature[2]
+        else:
+            if folder is not None:
+                strings = self.field_strings.setdefault(folder, dict())
+            sformat = '{%s[%s]}' % (self.match_signature[1], key)
+        if folder is None:
+            return papis.format.format(sformat, document).lower()
+        cache_key = folder if key is None else key
+        try:
+            return strings[cache_key]
+        except KeyError:
+            value = papis.format.format(sformat, document).lower()
+            strings[cache_key] = value
+            return value
+
+    def _check_match_signature(self) -> None:
+        signature = get_match_signature()
+        if signature != self.match_signature:
+            self.logger.debug("Match settings changed, rendering again")
+            self.match_signature = signature
+            self.match_strings = dict()
+            self.field_strings = dict()
+            self._clear_columns()
+            self.trigram_index = None
+
+    def _match_column(self, key: Optional[str], regex: str) -> List[int]:
+        """Match the strings of all documents for a given key against
+        a regular expression, using the worker pool if it pays off.
+        """
+        column = self._get_column(key)
+        if not (use_pool(len(column)) and HAS_SHARED_MEMORY):
+            return match_strings(column, regex)
+        if key not in self.shared_columns:
+            self.shared_columns[key] = SharedStrings(column)
+        return match_shared_strings(self.shared_columns[key], regex)
+
+    def _get_column(self, key: Optional[str]) -> List[str]:
+        """Get the strings of all documents for a given key, in the order
+        of the documents.
+        """
+        self._check_match_signature()
+        try:
+            return self.columns[key]
+        except KeyError:
+            column = [self.get_match_string(d, key)
+                      for d in self.get_documents()]
+            self.columns[key] = column
+            return column
+
+    def _clear_columns(self) -> None:
+        for shared in self.shared_columns.values():
+            shared.close()
+        self.shared_columns = dict()
+        self.columns = dict()
+
+    def _invalidate_match_strings(self, folder: str) -> None:
+        self.match_strings.pop(folder, None)
+        self.field_strings.pop(folder, None)
+        self._clear_columns()
+        if self.trigram_index is not None:
+            self.trigram_index.remove(folder)
+            self.trigram_pending.add(folder)
+
+    def _get_trigram_candidates(self, search: str) -> Optional[Set[int]]:
+        """Get the positions of the documents whose match-format may match
+        a general search, or None if all documents have to be scanned.
+        The trigram index is built when it starts paying off, see
+        :data:`TRIGRAM_INDEX_MIN_QUERIES`.
+        """
+        docs = self.get_documents()
+        self._check_match_signature()
+        if self.trigram_index is None:
+            self.scanned_queries += 1
+            if (len(docs) < TRIGRAM_INDEX_MIN_DOCUMENTS or
+                    self.scanned_queries <= TRIGRAM_INDEX_MIN_QUERIES):
+                return None
+            begin_t = time.time()
+            self.trigram_index = TrigramIndex()
+            self.trigram_pending = set(
+                str(d.get_main_folder()) for d in docs)
+            self._update_trigram_index()
+            self.logger.debug(
+                "Built trigram index in {0:.1f} ms"
+                .format(1000 * (time.time() - begin_t)))
+        else:
+            self._update_trigram_index()
+        assert self.trigram_index is not None
+        folders = self.trigram_index.get_candidates(search)
+        if folders is None:
+            return None
+        return set(self.folder_index[f] for f in folders)
+
+    def _update_trigram_index(self) -> None:
+        assert self.trigram_index is not None
+        docs = self.get_documents()
+        for folder in self.trigram_pending:
+            if folder in self.folder_index:
+                self.trigram_index.add(
+                    folder,
+                    self.get_match_string(docs[self.folder_index[folder]]))
+        self.trigram_pending = set()
+
+    def find_by_key(
+            self, key: str, value: Any) -> List[papis.document.Document]:
+        docs = self.get_documents()
+        normalized = papis.database.base.normalize_key_value(value)
+        if key not in self.key_index:
+            return [
+                d for d in docs
+                if d.has(key) and
+                papis.database.base.normalize_key_value(d[key]) == normalized]
+        return [
+            docs[self.folder_index[f]]
+            for f in self.key_index[key].get(normalized, [])]
 
     def get_all_query_string(self) -> str:
         return '.'
@@ -261,8 +888,145 @@ class Database(papis.database.base.Database):
         self.logger.debug(
             'Saving ... ({} documents)'.format(len(docs)))
         path = self._get_cache_file_path()
-        with open(path, "wb+") as fd:
-            pickle.dump(docs, fd)
+        # Write to a temporary file first so that a crash while saving
+        # can never leave a truncated cache behind
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb+") as fd:
+            pickle.dump(self._get_snapshot(), fd)
+        os.replace(tmp_path, path)
+        # The snapshot now contains everything that was in the journal
+        journal_path = get_journal_file_path(path)
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+
+    def _write_journal(self, record: JournalRecord) -> None:
+        """Append a single mutation to the journal of the cache, instead
+        of writing the whole cache again. The journal is merged into
+        the cache once it gets too big or too old.
+        """
+        if not papis.config.getboolean("use-cache"):
+            return
+        path = self._get_cache_file_path()
+        if not os.path.exists(path):
+            # There is no snapshot that the journal could be applied to
+            self.save()
+            return
+        journal_path = get_journal_file_path(path)
+        self.logger.debug('Journaling {0} of {1}'.format(*record[:2]))
+        # Only one write call so that concurrent writers do not interleave
+        with open(journal_path, "ab") as fd:
+            fd.write(pickle.dumps(record))
+
+        max_size = papis.config.getint("cache-journal-max-size") or 0
+        max_age = papis.config.getint("cache-journal-max-age") or 0
+        size = os.path.getsize(journal_path)
+        age = time.time() - os.path.getmtime(path)
+        if size > max_size or age > max_age:
+            self.logger.debug(
+                "Compacting journal ({0} bytes, {1:.0f} s old)"
+                .format(size, age))
+            self.save()
+
+    def _replay_journal(self) -> None:
+        """Apply the records in the journal on top of the loaded snapshot.
+        Replaying is idempotent, so a journal that has already been merged
+        into the snapshot can be safely applied again.
+        """
+        journal_path = get_journal_file_path(self._get_cache_file_path())
+        if not os.path.exists(journal_path):
+            return
+        assert self.documents is not None
+        documents = dict(
+            (d.get_main_folder(), d)
+            for d in self.documents)  # type: Dict[Optional[str], Any]
+        count = 0
+        with open(journal_path, "rb") as fd:
+            while True:
+                try:
+                    record = pickle.load(fd)  # type: JournalRecord
+                except EOFError:
+                    break
+                except Exception as e:
+                    # the last record might have been left half written
+                    self.logger.warning(
+                        "Discarding broken cache journal record ({0})"
+                        .format(e))
+                    break
+                op, folder, document, stat = record
+                count += 1
+                self._invalidate_match_strings(folder)
+                if op == "delete":
+                    documents.pop(folder, None)
+                    self.stats.pop(folder, None)
+                else:
+                    assert document is not None
+                    documents[folder] = papis.document.compact(document)
+                    self.stats[folder] = stat
+        self.logger.debug("Replayed {0} journal records".format(count))
+        self._set_documents(list(documents.values()))
+
+    def _get_snapshot(self) -> Dict[str, Any]:
+        return {
+            "version": CACHE_FORMAT_VERSION,
+            "documents": self.get_documents(),
+            "stats": self.stats,
+            "match_signature": self.match_signature,
+            "match_strings": self.match_strings,
+            "field_strings": self.field_strings,
+        }
+
+    def _load_snapshot(self, snapshot: Any) -> bool:
+        # Caches written by other versions of papis, including the oldest
+        # ones that only contain the list of documents, are built again
+        version = (snapshot.get("version")
+                   if isinstance(snapshot, dict) else None)
+        if version != CACHE_FORMAT_VERSION:
+            self.logger.info(
+                "The cache has format version {0} instead of {1}"
+                .format(version, CACHE_FORMAT_VERSION))
+            return False
+        self._set_documents(snapshot["documents"])
+        self.stats = snapshot["stats"]
+        self.match_signature = snapshot.get("match_signature")
+        self.match_strings = snapshot.get("match_strings", dict())
+        self.field_strings = snapshot.get("field_strings", dict())
+        return True
+
+    def _set_documents(self, documents: List[papis.document.Document]) -> None:
+        self.documents = documents
+        self._clear_columns()
+        self.trigram_index = None
+        self.bump_generation()
+        self.folder_index = {
+            d.get_main_folder(): i for i, d in enumerate(documents)}
+        self.key_index = {
+            k: dict() for k in papis.config.getlist('unique-document-keys')}
+        self.indexed_values = dict()
+        for doc in documents:
+            self._index_document(doc)
+
+    def _index_document(self, document: papis.document.Document) -> None:
+        folder = document.get_main_folder()
+        if folder is None:
+            return
+        self._unindex_document(folder)
+        values = dict()  # type: Dict[str, str]
+        for key, index in self.key_index.items():
+            if not document.has(key):
+                continue
+            value = papis.database.base.normalize_key_value(document[key])
+            index.setdefault(value, []).append(folder)
+            values[key] = value
+        self.indexed_values[folder] = values
+
+    def _unindex_document(self, folder: str) -> None:
+        # The values are looked up in indexed_values because the document
+        # might have been changed in place before being updated
+        for key, value in self.indexed_values.pop(folder, dict()).items():
+            folders = self.key_index[key][value]
+            folders.remove(folder)
+            if not folders:
+                del self.key_index[key][value]
 
     def _get_cache_file_path(self) -> str:
         return get_cache_file_path(self.lib.path_format())
@@ -272,10 +1036,10 @@ class Database(papis.database.base.Database):
             document: papis.document.Document
             ) -> List[Tuple[int, papis.document.Document]]:
         assert(isinstance(document, papis.document.Document))
-        result = list(filter(
-            lambda d: d[1].get_main_folder() == document.get_main_folder(),
-            enumerate(self.get_documents())))
-        if len(result) == 0:
+        docs = self.get_documents()
+        try:
+            index = self.folder_index[document.get_main_folder()]
+        except KeyError:
             raise Exception(
                 'The document passed could not be found in the library')
-        return result
+        return [(index, docs[index])]
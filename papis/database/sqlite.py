@@ -0,0 +1,468 @@
+"""This is the sqlite backend of papis, it uses the ``sqlite3`` module of
+the python standard library, so it does not need any extra dependency.
+
+The database is stored in a single file next to the cache files of the
+papis database, and it contains the following tables:
+
+- ``documents``: one row per document with its folder, the whole
+  document data, the rendered ``match-format`` of the document and
+  indexed columns for the ``doi``, ``ref``, ``year`` and ``tags`` keys.
+- ``fields``: one row per key of every document, used for queries
+  like ``author:einstein``.
+- ``documents_fts``: an
+  `FTS5 <https://www.sqlite.org/fts5.html>`_ index over the
+  ``match-format`` of the documents, used to find quickly the candidates
+  for general queries. It is only created if sqlite supports the
+  ``trigram`` tokenizer, otherwise all documents are candidates.
+
+The query language is the same as for the papis database (see
+:func:`papis.docmatcher.parse_query`), every query is translated into a
+single SQL statement by :func:`query_to_sql`.
+The database is opened in ``WAL`` mode, so that several processes
+can read it while another one writes to it, and every addition,
+update or deletion of a document is a single transaction.
+"""
+import os
+import re
+import pickle
+import logging
+import sqlite3
+
+import papis.config
+import papis.docmatcher
+import papis.document
+import papis.format
+import papis.database.base
+import papis.database.cache
+from papis.database.base import select_documents
+import papis.library
+import papis.strings
+from papis.utils import crawl_folders, folders_to_documents
+
+from typing import List, Dict, Optional, Any, Tuple, Iterable, Iterator
+
+#: Keys of the documents that have their own indexed column
+INDEXED_KEYS = ('doi', 'ref', 'year', 'tags')
+#: Version of the layout of the tables
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    folder TEXT UNIQUE NOT NULL,
+    data BLOB NOT NULL,
+    match_string TEXT NOT NULL,
+    doi TEXT,
+    ref TEXT,
+    year TEXT,
+    tags TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_doi ON documents(doi);
+CREATE INDEX IF NOT EXISTS documents_ref ON documents(ref);
+CREATE INDEX IF NOT EXISTS documents_year ON documents(year);
+CREATE INDEX IF NOT EXISTS documents_tags ON documents(tags);
+CREATE TABLE IF NOT EXISTS fields (
+    doc_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    norm TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fields_doc_id ON fields(doc_id);
+CREATE INDEX IF NOT EXISTS fields_key_norm ON fields(key, norm);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    match_string, content='documents', content_rowid='id',
+    tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts(rowid, match_string)
+    VALUES (new.id, new.match_string);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, match_string)
+    VALUES ('delete', old.id, old.match_string);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, match_string)
+    VALUES ('delete', old.id, old.match_string);
+    INSERT INTO documents_fts(rowid, match_string)
+    VALUES (new.id, new.match_string);
+END;
+"""
+
+
+def _regexp(regex: str, value: Optional[str]) -> bool:
+    # the re module keeps the compiled patterns in its own cache
+    return value is not None and re.match(regex, value, re.I) is not None
+
+
+def get_fts_query(search: str) -> Optional[str]:
+    """Create an FTS5 query for the ``trigram`` tokenizer out of the search
+    string of a clause. The trigram tokenizer can only find tokens of at
+    least three characters, shorter tokens are left to the regular
+    expression of the clause.
+
+    :param search: Search string of a clause
+    :type  search: str
+    :returns: FTS5 query or None if no token can be looked up
+
+    >>> get_fts_query('einstein 1905')
+    '"einstein" AND "1905"'
+    >>> get_fts_query('ab c') is None
+    True
+    """
+    tokens = [
+        '"{0}"'.format(token.replace('"', '""'))
+        for token in search.split() if len(token) >= 3]
+    return " AND ".join(tokens) if tokens else None
+
+
+def query_to_sql(
+        query: papis.docmatcher.CompiledQuery,
+        use_fts: bool = True) -> Tuple[str, List[Any]]:
+    """Translate a query of the papis query language into an SQL statement
+    selecting the ``folder`` and ``data`` of the matching documents.
+
+    :param query: Compiled papis query
+    :type  query: papis.docmatcher.CompiledQuery
+    :param use_fts: Whether the ``documents_fts`` table can be used
+    :type  use_fts: bool
+    :returns: SQL statement and its parameters
+
+    >>> query = papis.docmatcher.CompiledQuery(
+    ...     'einstein year:19', '{doc[title]}', 'doc')
+    >>> sql, params = query_to_sql(query)
+    >>> print(sql)
+    SELECT folder, data FROM documents WHERE id IN (SELECT rowid FROM \
+documents_fts WHERE documents_fts MATCH ?) AND match_string REGEXP ? AND id \
+IN (SELECT doc_id FROM fields WHERE key = ? AND value REGEXP ?) ORDER BY id
+    >>> params
+    ['"einstein"', '.*einstein.*', 'year', '.*19.*']
+    """
+    conditions = []  # type: List[str]
+    params = []  # type: List[Any]
+    for clause in query.clauses:
+        if clause.key is None:
+            fts_query = get_fts_query(clause.search) if use_fts else None
+            if fts_query is not None:
+                conditions.append(
+                    "id IN (SELECT rowid FROM documents_fts "
+                    "WHERE documents_fts MATCH ?)")
+                params.append(fts_query)
+            conditions.append("match_string REGEXP ?")
+            params.append(clause.regex)
+        elif clause.match_string(""):
+            # documents without the key match as well
+            continue
+        else:
+            conditions.append(
+                "id IN (SELECT doc_id FROM fields "
+                "WHERE key = ? AND value REGEXP ?)")
+            params.extend([clause.key, clause.regex])
+    if not query.clauses:
+        conditions.append("0")
+    sql = "SELECT folder, data FROM documents"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql + " ORDER BY id", params
+
+
+class Database(papis.database.base.Database):
+
+    def __init__(self, library: Optional[papis.library.Library] = None):
+        papis.database.base.Database.__init__(self, library)
+        self.logger = logging.getLogger('db:sqlite')
+        self.db_path = papis.database.cache.get_cache_file_path(
+            self.lib.path_format()) + ".sqlite"
+        self.connection = None  # type: Optional[sqlite3.Connection]
+        self.has_fts = False
+        self.match_signature = None  # type: Optional[str]
+        self.initialize()
+
+    def get_backend_name(self) -> str:
+        return 'sqlite'
+
+    def initialize(self) -> None:
+        """Open the database, creating the tables and indexing the library
+        if it has never been indexed before.
+        """
+        if self.connection is not None:
+            return
+        self.logger.debug("Opening database {0}".format(self.db_path))
+        # the connection may be used by other threads, e.g. by the papis
+        # daemon, which makes them take turns with a lock
+        connection = sqlite3.connect(
+            self.db_path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.create_function("regexp", 2, _regexp)
+        with connection:
+            connection.executescript(SCHEMA)
+            try:
+                connection.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError as e:
+                self.logger.debug("No full text search available ({0})"
+                                  .format(e))
+                self.has_fts = False
+        self.connection = connection
+
+        if self._get_meta("schema_version") != str(SCHEMA_VERSION):
+            self.do_indexing()
+        elif self._get_meta("match_signature") != self._get_signature():
+            self.render_match_strings()
+
+    def do_indexing(self) -> None:
+        """Go through all folders of the library and add all documents
+        to the database in a single transaction.
+        """
+        self.logger.info('Indexing library, this might take a while')
+        folders = crawl_folders(self.get_dirs())
+        documents = folders_to_documents(folders)
+        connection = self._get_connection()
+        with connection:
+            connection.execute("DELETE FROM fields")
+            connection.execute("DELETE FROM documents")
+            for document in documents:
+                self._write_document(connection, document)
+            self._set_meta("schema_version", str(SCHEMA_VERSION))
+            self._set_meta("match_signature", self._get_signature())
+        self.bump_generation()
+
+    def render_match_strings(self) -> None:
+        """Render again the ``match-format`` of every document, this is
+        needed whenever the settings it depends on change. The info files
+        of the documents are not read again.
+        """
+        self.logger.info("Match settings changed, updating database")
+        connection = self._get_connection()
+        with connection:
+            rows = connection.execute(
+                "SELECT id, folder, data FROM documents").fetchall()
+            connection.executemany(
+                "UPDATE documents SET match_string = ? WHERE id = ?",
+                [(self._get_match_string(self._to_document(folder, data)),
+                  doc_id)
+                 for doc_id, folder, data in rows])
+            self._set_meta("match_signature", self._get_signature())
+
+    def clear(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        self.logger.warning("Clearing the database {0}".format(self.db_path))
+        self.bump_generation()
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    def add(self, document: papis.document.Document) -> None:
+        self.logger.debug("Adding document")
+        connection = self._get_connection()
+        with connection:
+            self._write_document(connection, document)
+        self.bump_generation()
+
+    def update(self, document: papis.document.Document) -> None:
+        self.logger.debug("Updating document")
+        connection = self._get_connection()
+        with connection:
+            self._write_document(connection, document)
+        self.bump_generation()
+
+    def add_many(self, documents: List[papis.document.Document]) -> None:
+        self.logger.debug("Adding {0} documents".format(len(documents)))
+        connection = self._get_connection()
+        with connection:
+            for document in documents:
+                self._write_document(connection, document)
+        self.bump_generation()
+
+    def update_many(self, documents: List[papis.document.Document]) -> None:
+        self.logger.debug("Updating {0} documents".format(len(documents)))
+        self.add_many(documents)
+
+    def delete(self, document: papis.document.Document) -> None:
+        self.logger.debug("Deleting document")
+        connection = self._get_connection()
+        with connection:
+            doc_id = self._get_document_id(connection, document)
+            if doc_id is None:
+                raise Exception(
+                    'The document passed could not be found in the library')
+            connection.execute("DELETE FROM fields WHERE doc_id = ?",
+                               (doc_id,))
+            connection.execute("DELETE FROM documents WHERE id = ?",
+                               (doc_id,))
+        self.bump_generation()
+
+    def query_dict(
+            self, dictionary: Dict[str, str]) -> List[papis.document.Document]:
+        query_string = " ".join(
+            ["{}:\"{}\" ".format(key, val)
+                for key, val in dictionary.items()])
+        return self.query(query_string)
+
+    def query(
+            self,
+            query_string: str,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            sort_key: Optional[str] = None,
+            reverse: bool = False) -> List[papis.document.Document]:
+        self.logger.debug('Query string %s' % query_string)
+        sql, params = self._get_sql(query_string)
+        if sort_key is None and (limit is not None or offset):
+            # let sqlite skip the documents that are not needed
+            return self._to_documents(self._get_connection().execute(
+                sql + " LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset]))
+        key = self.get_query_cache_key(query_string)
+        documents = self.get_cached_query(key)
+        if documents is None:
+            documents = self._to_documents(
+                self._get_connection().execute(sql, params))
+            self.cache_query(key, documents)
+        return select_documents(documents, limit, offset, sort_key, reverse)
+
+    def iter_query(
+            self, query_string: str) -> Iterator[papis.document.Document]:
+        sql, params = self._get_sql(query_string)
+        for folder, data in self._get_connection().execute(sql, params):
+            yield self._to_document(folder, data)
+
+    def count(self, query_string: str) -> int:
+        sql, params = self._get_sql(query_string)
+        return int(self._get_connection().execute(
+            "SELECT COUNT(*) FROM ({0})".format(sql), params).fetchone()[0])
+
+    def exists(self, query_string: str) -> bool:
+        sql, params = self._get_sql(query_string)
+        return bool(self._get_connection().execute(
+            "SELECT EXISTS ({0})".format(sql), params).fetchone()[0])
+
+    def find_by_key(
+            self, key: str, value: Any) -> List[papis.document.Document]:
+        normalized = papis.database.base.normalize_key_value(value)
+        connection = self._get_connection()
+        if key in INDEXED_KEYS:
+            cursor = connection.execute(
+                "SELECT folder, data FROM documents WHERE {0} = ? "
+                "ORDER BY id".format(key), (normalized,))
+        else:
+            cursor = connection.execute(
+                "SELECT folder, data FROM documents WHERE id IN "
+                "(SELECT doc_id FROM fields WHERE key = ? AND norm = ?) "
+                "ORDER BY id", (key, normalized))
+        return self._to_documents(cursor)
+
+    def get_all_query_string(self) -> str:
+        return '.'
+
+    def get_generation(self) -> Tuple[int, ...]:
+        # the data version changes when other connections commit changes
+        data_version = self._get_connection().execute(
+            "PRAGMA data_version").fetchone()[0]
+        return (self.generation, int(data_version))
+
+    def get_all_documents(self) -> List[papis.document.Document]:
+        return self.query(self.get_all_query_string())
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.initialize()
+        assert self.connection is not None
+        return self.connection
+
+    def _get_sql(self, query_string: str) -> Tuple[str, List[Any]]:
+        if query_string == self.get_all_query_string():
+            return "SELECT folder, data FROM documents ORDER BY id", []
+        # the settings may have changed since the match strings were
+        # rendered, e.g. for a request of a client of the papis daemon
+        signature = self._get_signature()
+        if signature != self.match_signature:
+            if self._get_meta("match_signature") != signature:
+                self.render_match_strings()
+            self.match_signature = signature
+        return query_to_sql(
+            papis.docmatcher.compile_query(query_string),
+            use_fts=self.has_fts)
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._get_connection().execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else str(row[0])
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._get_connection().execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, value))
+
+    def _get_signature(self) -> str:
+        return repr(papis.database.cache.get_match_signature())
+
+    def _get_match_string(self, document: papis.document.Document) -> str:
+        return papis.format.format(
+            papis.config.getstring('match-format'), document).lower()
+
+    def _get_document_id(
+            self,
+            connection: sqlite3.Connection,
+            document: papis.document.Document) -> Optional[int]:
+        row = connection.execute(
+            "SELECT id FROM documents WHERE folder = ?",
+            (document.get_main_folder(),)).fetchone()
+        return None if row is None else int(row[0])
+
+    def _write_document(
+            self,
+            connection: sqlite3.Connection,
+            document: papis.document.Document) -> None:
+        """Insert or replace a document, this does not commit.
+        """
+        folder = document.get_main_folder()
+        if folder is None:
+            raise Exception(papis.strings.no_folder_attached_to_document)
+        normalize = papis.database.base.normalize_key_value
+        row = (
+            pickle.dumps(papis.document.to_dict(document)),
+            self._get_match_string(document),
+        ) + tuple(
+            normalize(document[k]) if document.has(k) else None
+            for k in INDEXED_KEYS)  # type: Tuple[Any, ...]
+
+        doc_id = self._get_document_id(connection, document)
+        if doc_id is None:
+            cursor = connection.execute(
+                "INSERT INTO documents "
+                "(data, match_string, doi, ref, year, tags, folder) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", row + (folder,))
+            doc_id = cursor.lastrowid
+        else:
+            connection.execute(
+                "UPDATE documents SET data = ?, match_string = ?, "
+                "doi = ?, ref = ?, year = ?, tags = ? WHERE id = ?",
+                row + (doc_id,))
+            connection.execute("DELETE FROM fields WHERE doc_id = ?",
+                               (doc_id,))
+        connection.executemany(
+            "INSERT INTO fields (doc_id, key, value, norm) "
+            "VALUES (?, ?, ?, ?)",
+            [(doc_id, key, str(value).lower(), normalize(value))
+             for key, value in document.items()])
+
+    def _to_document(self, folder: str, data: bytes
+                     ) -> papis.document.Document:
+        document = papis.document.from_data(pickle.loads(data))
+        document.set_folder(folder)
+        return document
+
+    def _to_documents(
+            self,
+            rows: Iterable[Tuple[str, bytes]]
+            ) -> List[papis.document.Document]:
+        return [self._to_document(folder, data) for folder, data in rows]
@@ -0,0 +1,336 @@
+"""
+Keep a database up to date with the changes made to the library on disk,
+using the ``inotify`` interface of Linux.
+
+Every directory of the library that is crawled, see
+:func:`papis.utils.crawl_folders`, is watched, and whenever an info file is
+created, modified, moved or deleted, or a document folder is moved or
+removed, the document is added, updated or deleted in the database.
+Bursts of events, e.g. from an editor saving a file or from moving many
+documents, are coalesced and applied together once the library has been
+quiet for a moment.
+
+The watcher can run in the foreground, as ``papis watch`` does, or in a
+background thread of a process that keeps the database open:
+
+.. code:: python
+
+    watcher = papis.database.watch.Watcher(papis.database.get())
+    watcher.start()
+    ...
+    with watcher.lock:
+        documents = watcher.database.query('einstein')
+
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import papis.config
+import papis.document
+import papis.database.base
+import papis.utils
+from typing import (  # noqa: ignore
+    Callable, List, Optional, Set, Tuple, Dict)
+
+InotifyEvent = Tuple[int, int, int, str]
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+#: Events that are watched in every directory of the library
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+    IN_CREATE | IN_DELETE | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+logger = logging.getLogger('database:watch')
+
+
+class Inotify:
+
+    """Minimal wrapper of the inotify system calls of the C library.
+
+    :raises OSError: If inotify is not available, e.g. not on Linux
+    """
+
+    def __init__(self) -> None:
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        self.libc = ctypes.CDLL(
+            ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            self._raise()
+
+    def _raise(self, path: Optional[str] = None) -> None:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), path)
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch the events of ``mask`` in a directory. Watching a
+        directory again returns the same watch descriptor.
+
+        :returns: Watch descriptor
+        """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            self._raise(path)
+        return int(wd)
+
+    def read(self, timeout: Optional[float] = None) -> List[InotifyEvent]:
+        """Wait for events for at most ``timeout`` seconds.
+
+        :returns: List of events ``(wd, mask, cookie, name)``
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []  # type: List[InotifyEvent]
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, pos)
+            pos += _EVENT_HEADER.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Watcher:
+
+    """Apply the changes of the info files of a library to its database.
+
+    :param database: Database of the library to watch
+    :param delay: Seconds without new events after which the pending
+        changes are applied
+    :param max_delay: Seconds after which the pending changes are applied
+        even if events keep coming
+    """
+
+    def __init__(
+            self,
+            database: papis.database.base.Database,
+            delay: float = 0.5,
+            max_delay: float = 5.0) -> None:
+        self.database = database
+        self.delay = delay
+        self.max_delay = max_delay
+        self.info_name = str(papis.config.getstring('info-name'))
+        self.nested = papis.config.getboolean('crawl-nested-documents')
+        self.ignore = papis.config.getlist('crawl-ignore') or []
+        #: Held while changes are applied, users of the database in other
+        #: threads should hold it as well
+        self.lock = threading.RLock()
+        self.inotify = Inotify()
+        self.paths = dict()  # type: Dict[int, str]
+        self.watch_limit_reached = False
+        self.pending = set()  # type: Set[str]
+        self.stopped = threading.Event()
+        self.thread = None  # type: Optional[threading.Thread]
+
+        with self.lock:
+            self.folders = set(
+                str(d.get_main_folder())
+                for d in database.get_all_documents())
+        found = set()  # type: Set[str]
+        for directory in database.get_dirs():
+            found.update(self.watch_tree(directory))
+        # catch up with documents added or removed since the database
+        # was last updated
+        self.pending = found.symmetric_difference(self.folders)
+
+    def watch_tree(self, directory: str) -> Set[str]:
+        """Watch a directory and all its subdirectories.
+
+        :returns: Folders with an info file found in the directory
+        """
+        found = set()  # type: Set[str]
+        folders = [directory]
+        while folders:
+            folder, has_info, subfolders = papis.utils.scan_folder(
+                folders.pop(), self.info_name, self.ignore)
+            self.add_watch(folder)
+            if has_info:
+                found.add(folder)
+                if not self.nested:
+                    continue
+            folders.extend(subfolders)
+        return found
+
+    def add_watch(self, directory: str) -> None:
+        """Watch a single directory."""
+        try:
+            self.paths[self.inotify.add_watch(directory, WATCH_MASK)] = \
+                directory
+        except OSError as e:
+            if e.errno != errno.ENOSPC:
+                logger.warning("Cannot watch '{0}': {1}".format(directory, e))
+            elif not self.watch_limit_reached:
+                self.watch_limit_reached = True
+                logger.warning(
+                    "Cannot watch more directories, changes in some of them "
+                    "will not be seen, the limit can be raised with the "
+                    "sysctl fs.inotify.max_user_watches")
+
+    def is_crawled(self, directory: str, name: str) -> bool:
+        """Whether a new folder in a watched directory is crawled."""
+        if papis.utils.is_ignored(name, self.ignore):
+            return False
+        return self.nested or not os.path.exists(
+            os.path.join(directory, self.info_name))
+
+    def process(self, events: List[InotifyEvent]) -> None:
+        """Mark the document folders affected by some events as pending."""
+        for wd, mask, cookie, name in events:
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Some events were lost, checking all folders")
+                self.pending.update(self.folders)
+                for libdir in self.database.get_dirs():
+                    self.pending.update(self.watch_tree(libdir))
+                continue
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            directory = self.paths.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    if self.is_crawled(directory, name):
+                        self.pending.update(self.watch_tree(path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    prefix = path + os.sep
+                    self.pending.update(
+                        f for f in self.folders
+                        if f == path or f.startswith(prefix))
+            elif name == self.info_name:
+                self.pending.add(directory)
+
+    def poll(self, timeout: Optional[float] = None) -> bool:
+        """Wait for events for at most ``timeout`` seconds and process
+        them.
+
+        :returns: True if some events were received
+        """
+        events = self.inotify.read(timeout)
+        self.process(events)
+        return bool(events)
+
+    def flush(self) -> None:
+        """Add, update or delete the pending documents in the database.
+        The database decides whether a document is added or updated, since
+        it may have been changed meanwhile, e.g. by the clients of the
+        papis daemon.
+        """
+        pending, self.pending = self.pending, set()
+        if not pending:
+            return
+        found = dict(
+            (folder, papis.document.from_folder(folder))
+            for folder in sorted(pending)
+            if os.path.exists(os.path.join(folder, self.info_name)))
+        added = []  # type: List[papis.document.Document]
+        updated = []  # type: List[papis.document.Document]
+        deleted = []  # type: List[papis.document.Document]
+        with self.lock:
+            self.folders = set(
+                str(d.get_main_folder())
+                for d in self.database.get_all_documents())
+            for folder in sorted(pending):
+                if folder in found:
+                    (updated if folder in self.folders else added).append(
+                        found[folder])
+                elif folder in self.folders:
+                    deleted.append(papis.document.Document(folder))
+            for document in deleted:
+                self._apply(self._delete_many, [document])
+            self._apply(self.database.add_many, added)
+            self._apply(self.database.update_many, updated)
+            self.folders.update(found)
+            self.folders.difference_update(
+                d.get_main_folder() for d in deleted)
+        if added or updated or deleted:
+            logger.info(
+                "Added {0}, updated {1} and deleted {2} documents"
+                .format(len(added), len(updated), len(deleted)))
+
+    def _delete_many(self, documents: List[papis.document.Document]) -> None:
+        for document in documents:
+            self.database.delete(document)
+
+    def _apply(
+            self,
+            method: Callable[[List[papis.document.Document]], None],
+            documents: List[papis.document.Document]) -> None:
+        # changes are applied one by one if applying them at once fails,
+        # so that a failure does not drop the other changes
+        if not documents:
+            return
+        try:
+            method(documents)
+            return
+        except Exception as e:
+            if len(documents) == 1:
+                logger.error(
+                    "Could not update '{0}' in the database: {1}"
+                    .format(documents[0].get_main_folder(), e))
+                return
+        for document in documents:
+            self._apply(method, [document])
+
+    def run(self) -> None:
+        """Apply the changes of the library until :meth:`stop` is called.
+        """
+        since = None  # type: Optional[float]
+        while not self.stopped.is_set():
+            received = self.poll(self.delay if self.pending else 1.0)
+            if not self.pending:
+                since = None
+                continue
+            since = since or time.time()
+            if received and time.time() - since < self.max_delay:
+                continue
+            self.flush()
+            since = None
+
+    def start(self) -> threading.Thread:
+        """Run the watcher in a daemon thread."""
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.run, name='papis-watch', daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self) -> None:
+        self.stop()
+        self.inotify.close()
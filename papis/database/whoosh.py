@@ -40,6 +40,7 @@ you will not be able to parse the publisher through a search.
 
 """
 import os
+import time
 import logging
 
 import whoosh
@@ -47,15 +48,22 @@ import whoosh.index
 import whoosh.qparser
 from whoosh.fields import Schema, FieldType
 from whoosh.writing import IndexWriter
+from whoosh.searching import Searcher
 
 import papis.config
 import papis.strings
 import papis.document
 import papis.database.base
 import papis.database.cache
-from papis.utils import get_cache_home, get_folders, folders_to_documents
+import papis.parallel
+from papis.database.base import select_documents
+from papis.database.cache import get_info_file_stat
+from papis.utils import get_cache_home, crawl_folders, folders_to_documents
 
-from typing import List, Dict, Optional, Any, KeysView
+from typing import List, Dict, Optional, Any, KeysView, Tuple, Iterator
+
+#: Below this number of documents the index is written by a single process
+MIN_PARALLEL_INDEXING = 1000
 
 
 class Database(papis.database.base.Database):
@@ -70,6 +78,12 @@ class Database(papis.database.base.Database):
                 papis.database.cache.get_cache_file_name(
                     self.lib.path_format()
                 )))  # type: str
+        # The index, its schema, a searcher and a query parser are opened
+        # once and kept, the searcher is refreshed when the index changes
+        self._index = None  # type: Optional[whoosh.index.Index]
+        self._schema = None  # type: Optional[Schema]
+        self._searcher = None  # type: Optional[Searcher]
+        self._parser = None  # type: Optional[whoosh.qparser.QueryParser]
 
         self.initialize()
 
@@ -78,23 +92,44 @@ class Database(papis.database.base.Database):
 
     def clear(self) -> None:
         import shutil
+        self.close()
         if self.index_exists():
             self.logger.warning('Clearing the database')
             shutil.rmtree(self.index_dir)
+        self.bump_generation()
 
     def add(self, document: papis.document.Document) -> None:
+        self.add_many([document])
+
+    def update(self, document: papis.document.Document) -> None:
+        self.update_many([document])
+
+    def add_many(self, documents: List[papis.document.Document]) -> None:
+        """Add all documents with a single writer and a single commit,
+        using several processes if there are many documents.
+        """
         schema_keys = self.get_schema_init_fields().keys()
-        self.logger.debug("adding document")
-        writer = self.get_writer()
-        self.add_document_with_writer(document, writer, schema_keys)
-        self.logger.debug("commiting document..")
+        self.logger.debug("adding {0} documents".format(len(documents)))
+        writer = self.get_writer(len(documents))
+        for document in documents:
+            self.add_document_with_writer(document, writer, schema_keys)
+        self.logger.debug("commiting documents..")
         writer.commit()
+        self.bump_generation()
 
-    def update(self, document: papis.document.Document) -> None:
-        """As it says in the docs, just delete the document and add it again
+    def update_many(self, documents: List[papis.document.Document]) -> None:
+        """Replace all documents in the index with a single writer and a
+        single commit.
         """
-        self.delete(document)
-        self.add(document)
+        schema_keys = self.get_schema_init_fields().keys()
+        self.logger.debug("updating {0} documents".format(len(documents)))
+        writer = self.get_writer()
+        for document in documents:
+            writer.update_document(
+                **self.get_document_fields(document, schema_keys))
+        self.logger.debug("commiting documents..")
+        writer.commit()
+        self.bump_generation()
 
     def delete(self, document: papis.document.Document) -> None:
         writer = self.get_writer()
@@ -104,6 +139,7 @@ class Database(papis.database.base.Database):
             self.get_id_value(document))
         self.logger.debug("commiting deletion..")
         writer.commit()
+        self.bump_generation()
 
     def query_dict(
             self, dictionary: Dict[str, str]) -> List[papis.document.Document]:
@@ -112,26 +148,87 @@ class Database(papis.database.base.Database):
                 for key, val in dictionary.items()])
         return self.query(query_string)
 
-    def query(self, query_string: str) -> List[papis.document.Document]:
+    def query(
+            self,
+            query_string: str,
+            limit: Optional[int] = None,
+            offset: int = 0,
+            sort_key: Optional[str] = None,
+            reverse: bool = False) -> List[papis.document.Document]:
+        """Find the documents matching a query, which are ordered by their
+        score unless ``sort_key`` is given. Documents are sorted by the
+        values stored in the index, so sorting by a field of the schema
+        does not need to read any info file.
+        """
         self.logger.debug('Query string %s' % query_string)
-        index = self.get_index()
-        qp = whoosh.qparser.MultifieldParser(
-            ['title', 'author', 'tags'],
-            schema=self.get_schema()
-        )
-        qp.add_plugin(whoosh.qparser.FuzzyTermPlugin())
-        query = qp.parse(query_string)
-        with index.searcher() as searcher:
-            results = searcher.search(query, limit=None)
-            self.logger.debug(results)
-            documents = [
-                papis.document.from_folder(r.get(self.get_id_key()))
-                for r in results]
-        return documents
+        key = self.get_query_cache_key(query_string)
+        documents = self.get_cached_query(key)
+        if documents is None:
+            if limit is not None and sort_key is None:
+                # let whoosh collect only the best scored documents
+                return self._search(query_string, offset + limit)[offset:]
+            documents = self._search(query_string)
+            self.cache_query(key, documents)
+        return select_documents(documents, limit, offset, sort_key, reverse)
+
+    def iter_query(
+            self, query_string: str) -> Iterator[papis.document.Document]:
+        """Iterate over the documents matching a query in the order of the
+        index, without scoring them. A searcher of its own is used, so
+        that the index can be changed while iterating.
+        """
+        query = self.get_parser().parse(query_string)
+        with self.get_index().searcher() as searcher:
+            for docnum in searcher.docs_for_query(query):
+                fields = searcher.stored_fields(docnum)
+                yield papis.document.LazyDocument(
+                    fields[self.get_id_key()],
+                    fields.get(self.get_data_key()))
+
+    def count(self, query_string: str) -> int:
+        """Count the documents matching a query from the postings of the
+        index, without scoring them or reading their stored fields.
+        """
+        documents = self.get_cached_query(
+            self.get_query_cache_key(query_string))
+        if documents is not None:
+            return len(documents)
+        searcher = self.get_searcher()
+        if query_string == self.get_all_query_string():
+            return int(searcher.doc_count())
+        query = self.get_parser().parse(query_string)
+        return sum(1 for _ in searcher.docs_for_query(query))
+
+    def exists(self, query_string: str) -> bool:
+        documents = self.get_cached_query(
+            self.get_query_cache_key(query_string))
+        if documents is not None:
+            return bool(documents)
+        query = self.get_parser().parse(query_string)
+        docnums = self.get_searcher().docs_for_query(query)
+        return next(iter(docnums), None) is not None
+
+    def _search(
+            self,
+            query_string: str,
+            limit: Optional[int] = None) -> List[papis.document.Document]:
+        searcher = self.get_searcher()
+        query = self.get_parser().parse(query_string)
+        results = searcher.search(query, limit=limit)
+        self.logger.debug(results)
+        return [
+            papis.document.LazyDocument(
+                r.get(self.get_id_key()),
+                r.get(self.get_data_key()))
+            for r in results]
 
     def get_all_query_string(self) -> str:
         return '*'
 
+    def get_generation(self) -> Tuple[int, ...]:
+        # other processes may have changed the index as well
+        return (self.generation, self.get_index().latest_generation())
+
     def get_all_documents(self) -> List[papis.document.Document]:
         return self.query(self.get_all_query_string())
 
@@ -143,6 +240,27 @@ class Database(papis.database.base.Database):
         """
         return 'whoosh_id_'
 
+    def get_data_key(self) -> str:
+        """Get the name of the stored field holding the values of the schema
+        fields of the documents as they are in the info files. These are
+        used to return documents from a query without reading their
+        info files, see :class:`papis.document.LazyDocument`.
+
+        :returns: key name
+        :rtype:  str
+        """
+        return 'whoosh_data_'
+
+    def get_stat_key(self) -> str:
+        """Get the name of the stored field holding the stat of the info
+        file of the documents when they were indexed, see
+        :func:`papis.database.cache.get_info_file_stat`.
+
+        :returns: key name
+        :rtype:  str
+        """
+        return 'whoosh_stat_'
+
     def get_id_value(self, document: papis.document.Document) -> str:
         """Get the value that is stored in the unique key identifier
         of the documents in the database. In the case of papis this is
@@ -167,7 +285,9 @@ class Database(papis.database.base.Database):
         if not os.path.exists(self.index_dir):
             self.logger.debug('Creating dir %s' % self.index_dir)
             os.makedirs(self.index_dir)
-        whoosh.index.create_in(self.index_dir, self.create_schema())
+        self.close()
+        self._index = whoosh.index.create_in(
+            self.index_dir, self.create_schema())
 
     def index_exists(self) -> Any:
         """Check if index already exists in index_dir()
@@ -194,7 +314,22 @@ class Database(papis.database.base.Database):
             database Schema
         :type  schema_keys: dict
         """
-        doc_d = dict()
+        writer.add_document(**self.get_document_fields(document, schema_keys))
+
+    def get_document_fields(
+            self,
+            document: papis.document.Document,
+            schema_keys: KeysView[str]) -> Dict[str, Any]:
+        """Create the fields of the index for a document.
+
+        :param document: Papis document
+        :type  document: papis.document.Document
+        :param schema_keys: Dictionary containing the defining keys of the
+            database Schema
+        :type  schema_keys: dict
+        :returns: Dictionary with the fields of the index
+        """
+        doc_d = dict()  # type: Dict[str, Any]
         doc_d.update(
             {
                 k: str(document[k]) or ''
@@ -202,7 +337,11 @@ class Database(papis.database.base.Database):
             }
         )
         doc_d[self.get_id_key()] = self.get_id_value(document)
-        writer.add_document(**doc_d)
+        doc_d[self.get_data_key()] = {
+            k: document[k] for k in schema_keys if document.has(k)}
+        doc_d[self.get_stat_key()] = get_info_file_stat(
+            doc_d[self.get_id_key()])
+        return doc_d
 
     def do_indexing(self) -> None:
         """This function initializes the database. Basically it goes through
@@ -212,15 +351,8 @@ class Database(papis.database.base.Database):
         at the time of building a brand new index.
         """
         self.logger.debug('Indexing the library, this might take a while...')
-        folders = sum(
-                [get_folders(d)
-                    for d in self.get_dirs()], [])  # type: List[str]
-        documents = folders_to_documents(folders)
-        schema_keys = self.get_schema_init_fields().keys()
-        writer = self.get_writer()
-        for doc in documents:
-            self.add_document_with_writer(doc, writer, schema_keys)
-        writer.commit()
+        folders = crawl_folders(self.get_dirs())
+        self.add_many(folders_to_documents(folders))
 
     def initialize(self) -> None:
         """Function to be called everytime a database object is created.
@@ -232,33 +364,19 @@ class Database(papis.database.base.Database):
         if self.index_exists():
             user_fields = self.get_schema_init_fields()
             db_fields = self.get_schema()
-
-            user_field_names = sorted(list(user_fields))
-            db_field_names = sorted(db_fields.names())
-
-            # If the user fields and the fields in the DB
-            # aren't the same, then we have to rebuild the
-            # database.
-            if user_field_names != db_field_names:
-                self.rebuild()
-                self.logger.debug("Rebuilt database because field names"
-                                  "don't match")
-            else:
-                # Otherwise, verify that the fields are
-                # all the same and rebuild if any have
-                # changed at all.
-                rebuilt_db = False
-                for field in user_field_names:
-                    if user_fields[field] != db_fields[field]:
-                        self.rebuild()
-                        self.logger.debug("Rebuilt DB because field types"
-                                          " don't match")
-                        rebuilt_db = True
-                        break
-
-                if not rebuilt_db:
-                    self.logger.debug('Initialized index found for library')
-                    return
+            changed_fields = sorted(
+                name
+                for name in set(user_fields).union(db_fields.names())
+                if name not in user_fields or name not in db_fields
+                or user_fields[name] != db_fields[name])
+            if not changed_fields:
+                self.logger.debug('Initialized index found for library')
+                return
+            self.logger.info(
+                "Schema fields changed ({0}), updating the index"
+                .format(", ".join(changed_fields)))
+            self.migrate()
+            return
         self.create_index()
         self.do_indexing()
 
@@ -267,29 +385,135 @@ class Database(papis.database.base.Database):
         self.create_index()
         self.do_indexing()
 
+    def migrate(self) -> None:
+        """Create the index again with the current schema, reusing the
+        values of the documents stored in the index. The info files are
+        only read for documents that changed since they were indexed,
+        according to the stat of their info file, or for all documents
+        if there are new fields in the schema, since their values are not
+        stored in the index.
+        Indices created by older versions of papis are rebuilt.
+        """
+        old_fields = self.get_schema().names()
+        if (self.get_data_key() not in old_fields or
+                self.get_stat_key() not in old_fields):
+            self.logger.info("The index is too old to be migrated")
+            self.rebuild()
+            return
+        new_fields = [
+            name for name in self.get_schema_init_fields()
+            if name not in old_fields]
+
+        begin_t = time.time()
+        documents = []  # type: List[papis.document.Document]
+        outdated = []  # type: List[str]
+        for fields in self.get_searcher().all_stored_fields():
+            folder = fields[self.get_id_key()]
+            stat = get_info_file_stat(folder)
+            if stat is None:
+                continue
+            if new_fields or stat != fields.get(self.get_stat_key()):
+                outdated.append(folder)
+            else:
+                document = papis.document.from_data(
+                    fields[self.get_data_key()])
+                document.set_folder(folder)
+                documents.append(document)
+        self.logger.info(
+            "Reading {0} info files again".format(len(outdated)))
+        documents.extend(folders_to_documents(outdated))
+
+        self.clear()
+        self.create_index()
+        self.add_many(documents)
+        self.logger.debug(
+            "Migrated index in {0:.1f} s".format(time.time() - begin_t))
+
     def get_index(self) -> whoosh.index.Index:
-        """Gets the index for the current library
+        """Gets the index for the current library, it is only opened
+        the first time.
 
         :returns: Index
         :rtype:  whoosh.index
         """
-        return whoosh.index.open_dir(self.index_dir)
+        if self._index is None:
+            self._index = whoosh.index.open_dir(self.index_dir)
+        return self._index
 
-    def get_writer(self) -> IndexWriter:
-        """Gets the writer for the current library
+    def get_searcher(self) -> Searcher:
+        """Gets a searcher for the latest version of the index. The same
+        searcher is kept between queries and it is only refreshed when
+        the index has been changed, by this or any other process.
 
+        :returns: Searcher
+        :rtype:  whoosh.searching.Searcher
+        """
+        if self._searcher is None:
+            self._searcher = self.get_index().searcher()
+        else:
+            searcher = self._searcher.refresh()
+            if searcher is not self._searcher:
+                # the schema might have changed with the index
+                self._schema = None
+                self._parser = None
+            self._searcher = searcher
+        return self._searcher
+
+    def get_parser(self) -> whoosh.qparser.QueryParser:
+        """Gets the parser for the queries of the user, which searches
+        by default in the title, author and tags.
+
+        :returns: Query parser
+        :rtype:  whoosh.qparser.QueryParser
+        """
+        if self._parser is None:
+            self._parser = whoosh.qparser.MultifieldParser(
+                ['title', 'author', 'tags'],
+                schema=self.get_schema()
+            )
+            self._parser.add_plugin(whoosh.qparser.FuzzyTermPlugin())
+        return self._parser
+
+    def close(self) -> None:
+        """Close the searcher and forget the index, so that it is opened
+        again when it is needed.
+        """
+        if self._searcher is not None:
+            self._searcher.close()
+        self._index = None
+        self._schema = None
+        self._searcher = None
+        self._parser = None
+
+    def get_writer(self, size: int = 1) -> IndexWriter:
+        """Gets the writer for the current library. Writers for at least
+        :data:`MIN_PARALLEL_INDEXING` documents use one process per cpu,
+        every process writing its own segment, unless the
+        ``parallel-executor`` does not use processes.
+
+        :param size: Number of documents that are going to be written
+        :type  size: int
         :returns: Writer
         :rtype:  whoosh.writer
         """
+        procs = 1
+        kind = papis.parallel.get_executor_kind(size, MIN_PARALLEL_INDEXING)
+        if kind in ('process', 'forkserver'):
+            procs = papis.parallel.get_workers(kind)
+        if procs > 1:
+            self.logger.debug("Writing with {0} processes".format(procs))
+            return self.get_index().writer(procs=procs, multisegment=True)
         return self.get_index().writer()
 
     def get_schema(self) -> Schema:
-        """Gets current schema
+        """Gets current schema, it is only read once from the index
 
         :returns: Whoosch Schema
         :rtype:  whoosh.fields.Schema
         """
-        return self.get_index().schema
+        if self._schema is None:
+            self._schema = self.get_index().schema
+        return self._schema
 
     def create_schema(self) -> Schema:
         """Creates and returns whoosh schema to be applied to the library
@@ -310,7 +534,11 @@ class Database(papis.database.base.Database):
         # This we need for the eval code beneath
         from whoosh.fields import TEXT, ID, KEYWORD, STORED  # noqa: F401
         # This part is non-negotiable
-        fields = {self.get_id_key(): ID(stored=True, unique=True)}
+        fields = {
+            self.get_id_key(): ID(stored=True, unique=True),
+            self.get_data_key(): STORED(),
+            self.get_stat_key(): STORED(),
+        }  # type: Dict[str, FieldType]
         # TODO: this is a security risk, find a way to fix it
         user_prototype = eval(
             papis.config.getstring('whoosh-schema-prototype'))  # KeysView[str]
@@ -1,6 +1,9 @@
 import papis.config
 import papis.document
+import papis.format
+import functools
 import logging
+import re
 from typing import Optional, List, Any, Callable
 MATCHER_TYPE = Callable[[papis.document.Document, str, Optional[str]], Any]
 
@@ -10,6 +13,12 @@ class DocMatcher(object):
     All its methods are static, it could be also implemented as a separate
     module.
 
+    .. note::
+
+        The state of this class is global, so it can not be used to match
+        two different queries at the same time. New code should rather use
+        :class:`CompiledQuery` through :func:`compile_query`.
+
     The static methods are to be used as follows:
     First the search string has to be set,
         DocMatcher.set_search(search_string)
@@ -114,10 +123,133 @@ class DocMatcher(object):
         return cls.parsed_search
 
 
-def parse_query(query_string: str) -> List[List[str]]:
+def get_regex_from_search(search: str) -> str:
+    r"""Creates a default regex from a search string.
+
+    :param search: A valid search string
+    :type  search: str
+    :returns: Regular expression
+    :rtype: str
+
+    >>> get_regex_from_search(' ein 192     photon')
+    '.*ein.*192.*photon.*'
+
+    >>> get_regex_from_search('{1234}')
+    '.*\\{1234\\}.*'
+    """
+    return ".*" + ".*".join(map(re.escape, search.split())) + ".*"
+
+
+class QueryClause:
+    """A single clause of a query, e.g. ``einstein`` or ``author:einstein``,
+    bound to the format that renders the string of a document that it is
+    matched against, and to the pattern matching this string.
+
+    :param key: Key of the clause or None for general clauses
+    :param search: Searched value
+    :param sformat: Format rendering the string to be matched
+    """
+
+    def __init__(self, key: Optional[str], search: str, sformat: str):
+        self.key = key
+        self.search = search
+        self.sformat = sformat
+        self.regex = get_regex_from_search(search)
+        self.pattern = re.compile(self.regex, re.IGNORECASE)
+
+    def get_string(self, doc: papis.format.FormatDocType) -> str:
+        """Render the string of the document that the clause matches"""
+        return papis.format.format(self.sformat, doc)
+
+    def match_string(self, string: str) -> bool:
+        return self.pattern.match(string) is not None
+
+    def match(self, doc: papis.format.FormatDocType) -> bool:
+        return self.match_string(self.get_string(doc))
+
+
+class CompiledQuery:
+    """A query of the papis query language, parsed once and ready to be
+    matched against any number of documents. Every clause has to match
+    for a document to match, and an empty query matches no document.
+
+    Compiled queries do not change after being created, so the same
+    object can be used from several threads, and it can be pickled to be
+    sent to other processes.
+
+    :param query_string: Query to be compiled
+    :param match_format: Format for clauses without key, the
+        ``match-format`` setting by default.
+    :param doc_name: Name of the document in the formats, the
+        ``format-doc-name`` setting by default.
+
+    >>> query = CompiledQuery('author : ein relativ', '{doc[title]}', 'doc')
+    >>> [(c.key, c.sformat) for c in query.clauses]
+    [('author', '{doc[author]}'), (None, '{doc[title]}')]
+    >>> doc = papis.document.from_data(
+    ...     dict(author='Einstein', title='Relativity'))
+    >>> query.match(doc)
+    True
+    >>> query.match(papis.document.from_data(dict(author='Einstein')))
+    False
+    """
+
+    def __init__(self,
+                 query_string: str,
+                 match_format: Optional[str] = None,
+                 doc_name: Optional[str] = None):
+        self.query_string = query_string
+        if match_format is None:
+            match_format = papis.config.getstring('match-format')
+        if doc_name is None:
+            doc_name = papis.config.getstring('format-doc-name')
+        self.clauses = []  # type: List[QueryClause]
+        for parsed in parse_query(query_string):
+            if len(parsed) == 3:
+                self.clauses.append(QueryClause(
+                    parsed[0], parsed[2], '{%s[%s]}' % (doc_name, parsed[0])))
+            else:
+                self.clauses.append(
+                    QueryClause(None, parsed[-1], match_format))
+
+    def match(self, doc: papis.format.FormatDocType) -> bool:
+        """Check if the document matches all the clauses of the query"""
+        return bool(self.clauses) and all(c.match(doc) for c in self.clauses)
+
+    def filter(
+            self, docs: List[papis.document.Document]
+            ) -> List[papis.document.Document]:
+        """Get the documents that match the query"""
+        return [d for d in docs if self.match(d)]
+
+
+def compile_query(query_string: str) -> CompiledQuery:
+    """Compile a query with the current ``match-format`` and
+    ``format-doc-name`` settings. The most recently compiled queries
+    are remembered, so compiling the same query again is cheap.
+
+    :param query_string: Query to be compiled
+    :type  query_string: str
+    :returns: Compiled query
+
+    >>> compile_query('einstein') is compile_query('einstein')
+    True
+    """
+    return _compile_query(
+        query_string,
+        papis.config.getstring('match-format'),
+        papis.config.getstring('format-doc-name'))
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_query(
+        query_string: str, match_format: str, doc_name: str) -> CompiledQuery:
+    return CompiledQuery(query_string, match_format, doc_name)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_query_grammar() -> Any:
     import pyparsing
-    logger = logging.getLogger('query_parser')
-    logger.debug('Parsing search')
 
     papis_key_word = pyparsing.Word(pyparsing.alphanums + '-._/')
     papis_value_word = pyparsing.Word(pyparsing.alphanums + '-._/()')
@@ -141,7 +273,13 @@ def parse_query(query_string: str) -> List[List[str]]:
             ) + papis_value
         )
     )
-    parsed = papis_query.parseString(query_string)  # type: List[List[str]]
+    return papis_query
 
+
+def parse_query(query_string: str) -> List[List[str]]:
+    logger = logging.getLogger('query_parser')
+    logger.debug('Parsing search')
+    parsed = _get_query_grammar().parseString(
+        query_string)  # type: List[List[str]]
     logger.debug('Parsed query = %s' % parsed)
     return parsed
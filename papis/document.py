@@ -1,11 +1,12 @@
 """Module defining the main document type.
 """
 import os
+import sys
 import datetime
 import shutil
 import logging
 from typing import (
-    List, Dict, Any, Optional, Union, NamedTuple, Callable, Tuple)
+    List, Dict, Any, Optional, Union, NamedTuple, Callable, Tuple, Iterable)
 from typing_extensions import TypedDict
 
 import papis.config
@@ -13,6 +14,10 @@ import papis
 
 LOGGER = logging.getLogger("document")  # type: logging.Logger
 
+#: Longest string value that :func:`compact` shares between documents,
+#: longer values like titles or abstracts are rarely repeated
+MAX_INTERNED_LENGTH = 64
+
 KeyConversion = TypedDict(
     "KeyConversion", {"key": Optional[str],
                       "action": Optional[Callable[[Any], Any]]}
@@ -108,10 +113,14 @@ class Document(Dict[str, Any]):
 
     """Class implementing the entry abstraction of a document in a library.
     It is basically a python dictionary with more methods.
+
+    The folder is kept in a slot and the paths derived from it are
+    computed when they are needed. The instance dictionary is only created
+    when other attributes are set, so that a library of many documents
+    takes little more memory than its data, see also :func:`compact`.
     """
 
-    subfolder = ""  # type: str
-    _info_file_path = ""  # type: str
+    __slots__ = ('_folder', '__dict__')
 
     def __init__(self, folder: Optional[str] = None,
                  data: Optional[Dict[str, Any]] = None):
@@ -134,6 +143,28 @@ class Document(Dict[str, Any]):
     def html_escape(self) -> DocHtmlEscaped:
         return DocHtmlEscaped(self)
 
+    @property
+    def subfolder(self) -> str:
+        """Folder of the document without the home directory, with spaces
+        instead of path separators, e.g. for the ``match-format``.
+        """
+        if not self._folder:
+            return ""
+        return (self._folder
+                    .replace(os.path.expanduser("~"), "")
+                    .replace("/", " "))
+
+    def __setstate__(self, state: Any) -> None:
+        # the state is the instance dictionary and the slots, documents
+        # pickled by older versions of papis only have a dictionary, which
+        # also holds the paths that are now derived from the folder
+        if not isinstance(state, tuple):
+            state = (state, None)
+        for attributes in state:
+            for name, value in (attributes or dict()).items():
+                if name not in ('subfolder', '_info_file_path'):
+                    setattr(self, name, value)
+
     def get_main_folder(self) -> Optional[str]:
         """Get full path for the folder where the document and the information
         is stored.
@@ -148,12 +179,6 @@ class Document(Dict[str, Any]):
         :type  folder: str
         """
         self._folder = folder
-        self._info_file_path = os.path.join(
-            folder,
-            papis.config.getstring('info-name'))
-        self.subfolder = (self._folder
-                              .replace(os.path.expanduser("~"), "")
-                              .replace("/", " "))
 
     def get_main_folder_name(self) -> Optional[str]:
         """Get main folder name where the document and the information is
@@ -172,21 +197,51 @@ class Document(Dict[str, Any]):
         """
         return key in self
 
-    def save(self) -> None:
-        """Saves the current document's information into the info file.
+    def save(self) -> bool:
+        """Saves the current document's information into the info file,
+        unless the info file already holds it. The info file is replaced
+        atomically, so that it is never left half written.
+
+        :returns: True if the info file was written
         """
         # FIXME: fix circular import in papis.yaml
         import papis.yaml
-        papis.yaml.data_to_yaml(self.get_info_file(),
-                                {key: self[key]
-                                 for key in self.keys() if self[key]})
+        text = self._dump()
+        if not self._is_dirty(text):
+            return False
+        path = self.get_info_file()
+        os.replace(
+            papis.yaml.write_temporary(path, text), os.path.realpath(path))
+        return True
+
+    def is_dirty(self) -> bool:
+        """Check whether the info file does not hold the current information
+        of the document, i.e., whether :meth:`save` would write it.
+
+        :returns: True/False
+        """
+        return self._is_dirty(self._dump())
+
+    def _dump(self) -> str:
+        import papis.yaml
+        return papis.yaml.data_to_string(
+            {key: self[key] for key in self.keys() if self[key]})
+
+    def _is_dirty(self, text: str) -> bool:
+        try:
+            with open(self.get_info_file()) as fd:
+                return bool(fd.read() != text)
+        except (OSError, UnicodeDecodeError):
+            return True
 
     def get_info_file(self) -> str:
         """Get full path for the info file
         :returns: Full path for the info file
         :rtype: str
         """
-        return self._info_file_path
+        if not self._folder:
+            return ""
+        return os.path.join(self._folder, papis.config.getstring('info-name'))
 
     def get_files(self) -> List[str]:
         """Get the files linked to the document, if any.
@@ -219,6 +274,53 @@ class Document(Dict[str, Any]):
                 self[key] = data[key]
 
 
+def save_many(documents: Iterable[Document]) -> List[Document]:
+    """Save several documents, writing only the info files that do not
+    hold the information of their documents yet. All the info files are
+    written to temporary files and flushed to the disk before any of them
+    replaces an old one, and then their folders are flushed, so that the
+    new names are on the disk as well.
+
+    :param documents: Documents to be saved
+    :type  documents: list
+    :returns: Documents whose info file was written
+    :rtype:  list
+    """
+    import papis.yaml
+    pending = []  # type: List[Tuple[Document, str]]
+    try:
+        for document in documents:
+            text = document._dump()
+            if document._is_dirty(text):
+                pending.append((document, papis.yaml.write_temporary(
+                    document.get_info_file(), text)))
+        for document, tmp_path in pending:
+            os.replace(tmp_path, os.path.realpath(document.get_info_file()))
+    except Exception:
+        for _, tmp_path in pending:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+    for folder in sorted(set(os.path.dirname(p) for _, p in pending)):
+        _fsync_folder(folder)
+    LOGGER.debug("Saved {0} documents".format(len(pending)))
+    return [document for document, _ in pending]
+
+
+def _fsync_folder(folder: str) -> None:
+    # only posix systems can open folders to flush them
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    try:
+        fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        LOGGER.debug("Could not flush '{0}': {1}".format(folder, e))
+
+
 def from_folder(folder_path: str) -> Document:
     """Construct a document object from a folder
 
@@ -230,6 +332,161 @@ def from_folder(folder_path: str) -> Document:
     return Document(folder=folder_path)
 
 
+def _intern(value: Any) -> Any:
+    if isinstance(value, str):
+        if len(value) <= MAX_INTERNED_LENGTH:
+            return sys.intern(value)
+        return value
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            value[i] = _intern(item)
+    elif isinstance(value, dict):
+        items = [(_intern(k), _intern(v)) for k, v in value.items()]
+        value.clear()
+        value.update(items)
+    return value
+
+
+def compact(document: Document) -> Document:
+    """Make a document share its keys and its short values, like years,
+    types, tags or journal names, with all other compacted documents.
+    The document is changed in place and keeps its keys and values, it
+    only takes less memory when many documents are kept at once, e.g. by
+    the cache of the ``papis`` database.
+
+    >>> a = compact(from_data({'journal': ''.join(['Nature'])}))
+    >>> b = compact(from_data({'journal': ''.join(['Nature'])}))
+    >>> a['journal'] is b['journal']
+    True
+
+    :param document: Document to compact
+    :type  document: Document
+    :returns: The same document
+    :rtype:  Document
+    """
+    # the dict methods do not load lazy documents, and filling the
+    # document again also shrinks a table that grew with many changes
+    items = [(_intern(k), _intern(v)) for k, v in dict.items(document)]
+    dict.clear(document)
+    dict.update(document, items)
+    return document
+
+
+class LazyDocument(Document):
+
+    """Document whose info file is only read when it is really needed.
+    It starts with the folder and some known keys, usually stored in an
+    index of a database, and it reads the info file the first time that
+    a key that is not known is accessed, when all keys are listed or
+    when the document is modified.
+
+    >>> doc = LazyDocument('/does/not/exist', {'title': 'Hello World'})
+    >>> doc['title']
+    'Hello World'
+    >>> doc.is_loaded()
+    False
+    >>> doc['author']
+    ''
+    >>> doc.is_loaded()
+    True
+    """
+
+    __slots__ = ('_loaded',)
+
+    def __init__(self, folder: str, data: Optional[Dict[str, Any]] = None):
+        Document.__init__(self)
+        self._loaded = False
+        self.set_folder(folder)
+        if data is not None:
+            dict.update(self, data)
+
+    def is_loaded(self) -> bool:
+        """Check if the info file has already been read.
+        """
+        # unpickled documents set their items before their attributes
+        return getattr(self, '_loaded', True)
+
+    def load(self) -> None:
+        self._loaded = True
+        Document.load(self)
+
+    def _ensure_loaded(self) -> None:
+        if not self.is_loaded():
+            self.load()
+
+    def __missing__(self, key: str) -> Any:
+        if self.is_loaded():
+            return ""
+        self.load()
+        return self[key]
+
+    def __contains__(self, key: object) -> bool:
+        if not dict.__contains__(self, key):
+            self._ensure_loaded()
+        return dict.__contains__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if not dict.__contains__(self, key):
+            self._ensure_loaded()
+        return dict.get(self, key, default)
+
+    def __iter__(self) -> Any:
+        self._ensure_loaded()
+        return dict.__iter__(self)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return dict.__len__(self)
+
+    def __repr__(self) -> str:
+        self._ensure_loaded()
+        return dict.__repr__(self)
+
+    def __eq__(self, other: object) -> bool:
+        self._ensure_loaded()
+        return dict.__eq__(self, other)
+
+    def keys(self) -> Any:
+        self._ensure_loaded()
+        return dict.keys(self)
+
+    def values(self) -> Any:
+        self._ensure_loaded()
+        return dict.values(self)
+
+    def items(self) -> Any:
+        self._ensure_loaded()
+        return dict.items(self)
+
+    def copy(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return dict.copy(self)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._ensure_loaded()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self._ensure_loaded()
+        dict.__delitem__(self, key)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self._ensure_loaded()
+        dict.update(self, *args, **kwargs)
+
+    def pop(self, *args: Any) -> Any:
+        self._ensure_loaded()
+        return dict.pop(self, *args)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self._ensure_loaded()
+        return dict.setdefault(self, key, default)
+
+    def clear(self) -> None:
+        self._loaded = True
+        dict.clear(self)
+
+
 def to_json(document: Document) -> str:
     """Export information into a json string
     :param document: Papis document
@@ -336,7 +593,18 @@ def from_data(data: Dict[str, Any]) -> Document:
     return Document(data=data)
 
 
-def sort(docs: List[Document], key: str, reverse: bool) -> List[Document]:
+SortKey = Tuple[int, datetime.datetime, int, str]
+
+
+def get_sort_key(key: str, reverse: bool = False
+                 ) -> Callable[[Document], SortKey]:
+    """Get the function giving the value that documents are sorted by
+    for a given key, see :func:`sort`.
+
+    :param key: Key of the documents to sort by
+    :param reverse: Whether the documents will be sorted in reverse order
+    :returns: Function of a document
+    """
     # The tuple returned by the _sort_for_key function represents:
     # (ranking, integer value, string value)
     # Rankings are:
@@ -358,9 +626,8 @@ def sort(docs: List[Document], key: str, reverse: bool) -> List[Document]:
 
     zero_date = datetime.datetime.fromtimestamp(0)
 
-    def _sort_for_key(key: str, doc: Document
-                      ) -> Tuple[int, datetime.datetime, int, str]:
-        if key in doc.keys():
+    def _sort_for_key(doc: Document) -> SortKey:
+        if doc.has(key):
             if key == 'time-added':
                 try:
                     date_value = \
@@ -385,8 +652,12 @@ def sort(docs: List[Document], key: str, reverse: bool) -> List[Document]:
             # The key does not appear in the document, ensure
             # it comes last.
             return (sort_rankings["None"], zero_date, 0, '')
+    return _sort_for_key
+
+
+def sort(docs: List[Document], key: str, reverse: bool) -> List[Document]:
     LOGGER.debug("sorting %d documents", len(docs))
-    return sorted(docs, key=lambda d: _sort_for_key(key, d), reverse=reverse)
+    return sorted(docs, key=get_sort_key(key, reverse), reverse=reverse)
 
 
 def new(folder_path: str, data: Dict[str, Any],
@@ -1,5 +1,7 @@
+import functools
 import logging
-from typing import Optional, Union, Any, Dict
+import re
+from typing import Optional, Union, Any, Dict, Callable
 
 import papis.config
 import papis.plugin
@@ -8,6 +10,7 @@ from papis.document import Document
 
 
 FormatDocType = Union[Document, Dict[str, Any]]
+CompiledFormat = Callable[[FormatDocType], str]
 LOGGER = logging.getLogger("format")
 _FORMATER = None  # type: Optional[Formater]
 
@@ -27,6 +30,17 @@ class Formater:
         """
         ...
 
+    def compile(self, fmt: str, key: str = "") -> CompiledFormat:
+        """Prepare a format string for formatting many documents, e.g. all
+        the headers shown by the picker, with the settings of the moment.
+
+        :param fmt: Format string
+        :type  fmt: str
+        :returns: Function formatting a document with ``fmt``
+        """
+        doc_name = key or papis.config.getstring("format-doc-name")
+        return functools.partial(self.format, fmt, key=doc_name)
+
 
 class PythonFormater(Formater):
     """Construct a string using a pythonic format string and a document.
@@ -36,13 +50,39 @@ class PythonFormater(Formater):
                fmt: str,
                doc: FormatDocType,
                key: str = "") -> str:
+        return self.compile(fmt, key)(doc)
+
+    def compile(self, fmt: str, key: str = "") -> CompiledFormat:
         doc_name = key or papis.config.getstring("format-doc-name")
-        fdoc = Document()
-        fdoc.update(doc)
-        try:
-            return fmt.format(**{doc_name: fdoc})
-        except Exception as exception:
-            return str(exception)
+        copy = _uses_attributes(fmt, doc_name)
+
+        def _format(doc: FormatDocType) -> str:
+            # documents are formatted as they are, unless the format reads
+            # their attributes, which have always been those of a copy
+            # without a folder, e.g. the subfolder is empty
+            if copy or not isinstance(doc, Document):
+                doc = Document(data=doc)
+            try:
+                return fmt.format_map({doc_name: doc})
+            except Exception as exception:
+                return str(exception)
+
+        return _format
+
+
+@functools.lru_cache(maxsize=128)
+def _uses_attributes(fmt: str, doc_name: str) -> bool:
+    """Check whether a python format string may read attributes of the
+    document other than ``html_escape``, which is the same for a copy.
+
+    >>> _uses_attributes('{doc[title]} {doc.html_escape[author]}', 'doc')
+    False
+    >>> _uses_attributes('{doc[title]}{doc.subfolder}', 'doc')
+    True
+    """
+    return re.search(
+        r"\b{0}\.(?!html_escape\b)".format(re.escape(doc_name)),
+        fmt) is not None
 
 
 class Jinja2Formater(Formater):
@@ -67,11 +107,29 @@ class Jinja2Formater(Formater):
                fmt: str,
                doc: FormatDocType,
                key: str = "") -> str:
+        return self.compile(fmt, key)(doc)
+
+    def compile(self, fmt: str, key: str = "") -> CompiledFormat:
         doc_name = key or papis.config.getstring("format-doc-name")
         try:
-            return str(self.jinja2.Template(fmt).render(**{doc_name: doc}))
+            template = _get_jinja2_template(fmt)
         except Exception as exception:
-            return str(exception)
+            error = str(exception)
+            return lambda doc: error
+
+        def _format(doc: FormatDocType) -> str:
+            try:
+                return str(template.render({doc_name: doc}))
+            except Exception as exception:
+                return str(exception)
+
+        return _format
+
+
+@functools.lru_cache(maxsize=128)
+def _get_jinja2_template(fmt: str) -> Any:
+    import jinja2
+    return jinja2.Template(fmt)
 
 
 def _extension_name() -> str:
@@ -95,8 +153,35 @@ def get_formater() -> Formater:
     return _FORMATER
 
 
+def clear_formater() -> None:
+    """Forget the formater in use, so that it is looked up again from the
+    ``formater`` setting, e.g. after the setting changed.
+    """
+    global _FORMATER
+    _FORMATER = None
+
+
 def format(fmt: str,
            doc: FormatDocType,
            key: str = "") -> str:
     formater = get_formater()
     return formater.format(fmt, doc, key)
+
+
+def compile(fmt: str, key: str = "") -> CompiledFormat:
+    """Prepare a format string to format many documents with the formater
+    in use. The settings are read and the template is compiled only once,
+    instead of for every document as with :func:`format`.
+
+    >>> header = compile('{doc[author]}: {doc[title]}')
+    >>> header(dict(author='Turing', title='Computing machinery'))
+    'Turing: Computing machinery'
+
+    :param fmt: Format string
+    :type  fmt: str
+    :param key: Name of the document in the format, by default
+        the ``format-doc-name`` setting
+    :type  key: str
+    :returns: Function formatting a document with ``fmt``
+    """
+    return get_formater().compile(fmt, key)
@@ -1,13 +1,26 @@
 import click
 import json
 import logging
-from typing import List
+from typing import List, Iterable, Iterator
 
 import papis.document
 
 
 def exporter(documents: List[papis.document.Document]) -> str:
-    return json.dumps([papis.document.to_dict(doc) for doc in documents])
+    return "".join(iter_exporter(documents))
+
+
+def iter_exporter(
+        documents: Iterable[papis.document.Document]) -> Iterator[str]:
+    """Export documents to a json list piece by piece.
+
+    >>> list(iter_exporter([papis.document.from_data({'a': 1})] * 2))
+    ['[', '{"a": 1}', ', {"a": 1}', ']']
+    """
+    yield "["
+    for i, doc in enumerate(documents):
+        yield (", " if i else "") + json.dumps(papis.document.to_dict(doc))
+    yield "]"
 
 
 @click.command('json')
@@ -0,0 +1,160 @@
+"""
+Executors shared by the parts of papis that distribute work, like
+parsing the info files of a library or matching the documents of a
+query.
+
+The kind of executor is given by the
+:ref:`parallel-executor <config-settings-parallel-executor>` setting:
+
+- ``serial``: the work is done in the calling thread.
+- ``thread``: a pool of threads, which pays off when the work mostly
+  waits for the disk, e.g. on network file systems.
+- ``process``: a pool of processes started with the default method of
+  the platform.
+- ``forkserver``: a pool of processes started by a fork server.
+- ``auto``: ``serial`` for small amounts of work, or on a single cpu,
+  and ``process`` otherwise.
+
+A process that runs other threads, like :mod:`papis.daemon`, uses
+``thread`` instead of ``process``, since forking it while one of its
+threads holds a lock can leave the forked process waiting for that lock
+forever.
+
+The executors are started the first time they are needed and reused
+by the whole process.
+"""
+import atexit
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import papis.config
+from typing import Any, Callable, Dict, Iterable, List, Optional  # noqa: ignore
+
+#: Kinds of executors
+EXECUTOR_KINDS = ('serial', 'thread', 'process', 'forkserver')
+#: Below this number of items ``auto`` does the work serially
+MIN_PARALLEL_SIZE = 1000
+#: Number of chunks given to every worker, so that the work stays balanced
+#: when some chunks are slower than others
+CHUNKS_PER_WORKER = 4
+
+_EXECUTORS = dict()  # type: Dict[str, concurrent.futures.Executor]
+_EXECUTORS_PID = None  # type: Optional[int]
+
+logger = logging.getLogger("parallel")
+
+
+def get_executor_kind(size: Optional[int] = None,
+                      min_size: int = MIN_PARALLEL_SIZE) -> str:
+    """Get the kind of executor to use for a given amount of work.
+
+    :param size: Number of items to be processed, if known
+    :type  size: int
+    :param min_size: Number of items from which ``auto`` uses processes
+    :type  min_size: int
+    :returns: One of :data:`EXECUTOR_KINDS`
+    """
+    kind = papis.config.getstring('parallel-executor') or 'auto'
+    if kind not in EXECUTOR_KINDS:
+        if kind != 'auto':
+            logger.warning("Unknown parallel-executor '{0}'".format(kind))
+        # FIXME: find a better solution for this that works for both OSes
+        if (sys.platform == "win32" or
+                multiprocessing.cpu_count() == 1 or
+                (size is not None and size < min_size)):
+            return 'serial'
+        kind = 'process'
+    if kind == 'process' and threading.active_count() > 1:
+        return 'thread'
+    return kind
+
+
+def get_workers(kind: str) -> int:
+    """Get the number of workers of an executor."""
+    if kind == 'serial':
+        return 1
+    if kind == 'thread':
+        return min(32, multiprocessing.cpu_count() + 4)
+    return multiprocessing.cpu_count()
+
+
+def get_chunksize(size: int, workers: int) -> int:
+    """Get the number of items given at once to the workers.
+
+    >>> get_chunksize(100000, 4)
+    6250
+    >>> get_chunksize(3, 4)
+    1
+    """
+    return max(1, -(-size // (CHUNKS_PER_WORKER * workers)))
+
+
+def get_executor(kind: str) -> concurrent.futures.Executor:
+    """Get the executor of a given kind, which is not ``serial``.
+
+    :param kind: One of :data:`EXECUTOR_KINDS`
+    :type  kind: str
+    :returns: Executor shared by the whole process
+    """
+    global _EXECUTORS, _EXECUTORS_PID
+    # a forked process must not use the executors of its parent
+    if _EXECUTORS_PID != os.getpid():
+        _EXECUTORS = dict()
+        _EXECUTORS_PID = os.getpid()
+    try:
+        return _EXECUTORS[kind]
+    except KeyError:
+        pass
+    workers = get_workers(kind)
+    logger.debug("Starting {0} executor with {1} workers"
+                 .format(kind, workers))
+    executor = None  # type: Optional[concurrent.futures.Executor]
+    if kind == 'thread':
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+    elif kind == 'forkserver' and sys.version_info >= (3, 7):
+        executor = concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('forkserver'))
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    _EXECUTORS[kind] = executor
+    return executor
+
+
+def map(func: Callable[[Any], Any],
+        items: Iterable[Any],
+        kind: Optional[str] = None,
+        min_size: int = MIN_PARALLEL_SIZE) -> List[Any]:
+    """Apply a function to all items, in parallel if it pays off. With
+    processes the function and the items have to be picklable.
+
+    :param func: Function of one argument
+    :param items: Items to apply the function to
+    :param kind: Kind of executor, by default :func:`get_executor_kind`
+    :type  kind: str
+    :param min_size: Number of items from which ``auto`` uses processes
+    :type  min_size: int
+    :returns: List of the results, in the order of the items
+
+    >>> map(abs, [-1, 2, -3], kind='thread')
+    [1, 2, 3]
+    """
+    items = list(items)
+    kind = kind or get_executor_kind(len(items), min_size)
+    if kind == 'serial' or not items:
+        return [func(item) for item in items]
+    chunksize = get_chunksize(len(items), get_workers(kind))
+    return list(get_executor(kind).map(func, items, chunksize=chunksize))
+
+
+def _shutdown() -> None:
+    global _EXECUTORS
+    if _EXECUTORS_PID == os.getpid():
+        for executor in _EXECUTORS.values():
+            executor.shutdown(wait=False)
+    _EXECUTORS = dict()
+
+
+atexit.register(_shutdown)
@@ -1,11 +1,11 @@
 import logging
 import os
-import functools
 from typing import Callable, TypeVar, Generic, Sequence, Type
 from abc import ABC, abstractmethod
 
 import papis.config
 import papis.document
+import papis.format
 import papis.plugin
 
 LOGGER = logging.getLogger("pick")
@@ -75,8 +75,6 @@ def pick_doc(
     else:
         header_format = papis.config.getstring("header-format")
     match_format = papis.config.getstring("match-format")
-    header_filter = functools.partial(papis.format.format, header_format)
-    match_filter = functools.partial(papis.format.format, match_format)
     return pick(documents,
-                header_filter=header_filter,
-                match_filter=match_filter)
+                header_filter=papis.format.compile(header_format),
+                match_filter=papis.format.compile(match_format))
@@ -1,8 +1,9 @@
-from itertools import count, product
-from typing import Optional, List, Iterator, Any, Dict, Union
+from itertools import count, product, repeat
+from typing import Optional, List, Iterator, Any, Dict, Union, Tuple
+import concurrent.futures
 import copy
+import fnmatch
 import logging
-import multiprocessing
 import os
 import re
 import shlex
@@ -17,6 +18,7 @@ import papis.importer
 import papis.downloaders
 import papis.document
 import papis.database
+import papis.parallel
 
 LOGGER = logging.getLogger("utils")
 LOGGER.debug("importing")
@@ -62,21 +64,132 @@ def open_file(file_path: str, wait: bool = True) -> None:
 def get_folders(folder: str) -> List[str]:
     """This is the main indexing routine. It looks inside ``folder`` and crawls
     the whole directory structure in search for subfolders containing an info
-    file.
+    file, see :func:`crawl_folders`.
 
     :param folder: Folder to look into.
     :type  folder: str
     :returns: List of folders containing an info file.
     :rtype: list
     """
-    LOGGER.debug("Indexing folders in '{0}'".format(folder))
-    folders = list()
-    for root, dirnames, filenames in os.walk(folder):
-        if os.path.exists(
-                os.path.join(root, papis.config.getstring('info-name'))):
-            folders.append(root)
-    LOGGER.debug("{0} valid folders retrieved".format(len(folders)))
-    return folders
+    return crawl_folders([folder])
+
+
+def is_ignored(name: str, ignore: List[str]) -> bool:
+    """Whether a file or folder is skipped when crawling a library.
+
+    :param name: Name of the file or folder, without its directory
+    :type  name: str
+    :param ignore: Shell patterns, see ``crawl-ignore``
+    :type  ignore: list
+
+    >>> is_ignored('supplementary-material', ['.git', 'supplementary*'])
+    True
+    """
+    return any(fnmatch.fnmatch(name, p) for p in ignore)
+
+
+def scan_folder(
+        folder: str,
+        info_name: str,
+        ignore: List[str]) -> Tuple[str, bool, List[str]]:
+    """Read a single folder of a library, as :func:`crawl_folders` does.
+
+    :param folder: Folder to read
+    :type  folder: str
+    :param info_name: Name of the info files
+    :type  info_name: str
+    :param ignore: Shell patterns of the names that are skipped
+    :type  ignore: list
+    :returns: The folder, whether it has an info file and its subfolders
+        that are not ignored
+    """
+    has_info = False
+    subfolders = []  # type: List[str]
+    try:
+        # the iterator is only a context manager from python 3.6 on
+        entries = os.scandir(folder)
+        try:
+            for entry in entries:
+                if entry.name == info_name:
+                    has_info = True
+                elif is_ignored(entry.name, ignore):
+                    continue
+                elif entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.path)
+        finally:
+            if hasattr(entries, 'close'):
+                entries.close()
+    except OSError as e:
+        LOGGER.debug("Cannot read '{0}': {1}".format(folder, e))
+    return folder, has_info, subfolders
+
+
+def _scan_folders(
+        folders: List[str],
+        info_name: str,
+        ignore: List[str]) -> List[Tuple[str, bool, List[str]]]:
+    return [scan_folder(f, info_name, ignore) for f in folders]
+
+
+def crawl_folders(
+        folders: List[str],
+        nested: Optional[bool] = None,
+        ignore: Optional[List[str]] = None,
+        workers: Optional[int] = None) -> List[str]:
+    """Crawl several folders in search for subfolders containing an info
+    file. The directories are read with :func:`os.scandir` in a pool of
+    threads, so that many of them are read at the same time, which pays off
+    specially on network file systems.
+
+    :param folders: Folders to look into.
+    :type  folders: list
+    :param nested: Whether to look for documents inside the folders of
+        other documents, by default ``crawl-nested-documents``.
+    :type  nested: bool
+    :param ignore: Shell patterns of the names of the files and folders
+        that are not crawled, by default ``crawl-ignore``.
+    :type  ignore: list
+    :param workers: Number of threads, one means that no thread is used.
+    :type  workers: int
+    :returns: Sorted list of folders containing an info file.
+    :rtype: list
+    """
+    LOGGER.debug("Indexing folders in '{0}'".format("', '".join(folders)))
+    begin_t = time.time()
+    info_name = str(papis.config.getstring('info-name'))
+    if nested is None:
+        nested = papis.config.getboolean('crawl-nested-documents')
+    if ignore is None:
+        ignore = papis.config.getlist('crawl-ignore') or []
+    found = []  # type: List[str]
+
+    def visited(result: Tuple[str, bool, List[str]]) -> List[str]:
+        folder, has_info, subfolders = result
+        if has_info:
+            found.append(folder)
+            if not nested:
+                return []
+        return subfolders
+
+    # the folders are crawled level by level, every level is split into
+    # a few chunks per thread, so that the threads are not paid for every
+    # single folder
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    level = list(folders)
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        while level:
+            size = -(-len(level) // (4 * workers))
+            chunks = [level[i:i + size] for i in range(0, len(level), size)]
+            if workers == 1 or len(chunks) == 1:
+                results = [_scan_folders(c, info_name, ignore) for c in chunks]
+            else:
+                results = list(executor.map(
+                    _scan_folders, chunks,
+                    repeat(info_name), repeat(ignore)))
+            level = [f for chunk in results for r in chunk for f in visited(r)]
+    LOGGER.debug("{0} valid folders retrieved in {1:.1f} ms".format(
+        len(found), 1000 * (time.time() - begin_t)))
+    return sorted(found)
 
 
 def create_identifier(input_list: str) -> Iterator[str]:
@@ -142,7 +255,7 @@ def locate_document_in_lib(
     for k in comparing_keys:
         if not document.has(k):
             continue
-        docs = db.query_dict({k: document[k]})
+        docs = db.find_by_key(k, document[k])
         if docs:
             return docs[0]
 
@@ -175,8 +288,9 @@ def locate_document(
 
 
 def folders_to_documents(folders: List[str]) -> List[papis.document.Document]:
-    """Turn folders into documents, this is done in a multiprocessing way, this
-    step is quite critical for performance.
+    """Turn folders into documents, this is done in parallel for big
+    libraries, see :mod:`papis.parallel`, since this step is quite critical
+    for performance.
 
     :param folders: List of folder paths.
     :type  folders: list
@@ -184,13 +298,11 @@ def folders_to_documents(folders: List[str]) -> List[papis.document.Document]:
     :rtype:  list
     """
     logger = logging.getLogger("utils:dir2doc")
-    np = multiprocessing.cpu_count()
-    logger.debug("converting folder into documents on {0} cores".format(np))
-    pool = multiprocessing.Pool(np)
+    kind = papis.parallel.get_executor_kind(len(folders))
+    logger.debug("converting {0} folders into documents ({1})"
+                 .format(len(folders), kind))
     begin_t = time.time()
-    result = pool.map(papis.document.from_folder, folders)
-    pool.close()
-    pool.join()
+    result = papis.parallel.map(papis.document.from_folder, folders, kind)
     logger.debug("done in %.1f ms" % (1000*time.time()-1000*begin_t))
     return result
 
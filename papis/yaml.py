@@ -1,8 +1,16 @@
 import yaml
+import hashlib
 import logging
 import click
 import os
-from typing import Optional, List, Dict, Any
+import pickle
+import shutil
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CDumper as Dumper
+except ImportError:  # pyyaml was built without libyaml
+    from yaml import SafeLoader, Dumper  # type: ignore
 
 import papis.utils
 import papis.config
@@ -12,35 +20,131 @@ import papis.document
 logger = logging.getLogger("yaml")
 
 
+def data_to_string(data: Dict[str, Any]) -> str:
+    """
+    Dump data to the yaml text of an info file
+
+    :param data: Data in a dictionary
+    :type  data: dict
+    :returns: Yaml text
+    :rtype:  str
+    """
+    return str(yaml.dump(
+        data,
+        Dumper=Dumper,
+        allow_unicode=papis.config.getboolean("info-allow-unicode"),
+        default_flow_style=False))
+
+
+def write_temporary(path: str, text: str, fsync: bool = True) -> str:
+    """
+    Write text into a temporary file next to ``path``, which is meant to
+    be moved over it with :func:`os.replace`, so that ``path`` is never
+    left half written. The temporary file gets the permissions of
+    ``path``, if it exists.
+
+    :param path: Path of the file to be replaced, it may be a symlink
+    :type  path: str
+    :param text: Contents of the file
+    :type  text: str
+    :param fsync: Whether to flush the file to the disk right away
+    :type  fsync: bool
+    :returns: Path of the temporary file
+    :rtype:  str
+    """
+    tmp_path = '{0}.tmp-{1}'.format(os.path.realpath(path), os.getpid())
+    with open(tmp_path, 'w') as fd:
+        fd.write(text)
+        if fsync:
+            fd.flush()
+            os.fsync(fd.fileno())
+    if os.path.exists(path):
+        shutil.copymode(path, tmp_path)
+    return tmp_path
+
+
 def data_to_yaml(yaml_path: str, data: Dict[str, Any]) -> None:
     """
-    Save data to yaml at path outpath
+    Save data to yaml at path outpath. The file is replaced atomically,
+    see :func:`write_temporary`.
 
     :param yaml_path: Path to a yaml file
     :type  yaml_path: str
     :param data: Data in a dictionary
     :type  data: dict
     """
-    with open(yaml_path, 'w+') as fd:
-        yaml.dump(
-            data,
-            fd,
-            allow_unicode=papis.config.getboolean("info-allow-unicode"),
-            default_flow_style=False)
+    tmp_path = write_temporary(yaml_path, data_to_string(data))
+    os.replace(tmp_path, os.path.realpath(yaml_path))
 
 
 def exporter(documents: List[papis.document.Document]) -> str:
-    string = yaml.dump_all(
-        [papis.document.to_dict(document) for document in documents],
-        allow_unicode=True)
-    return str(string)
+    return "".join(iter_exporter(documents))
+
+
+def iter_exporter(
+        documents: Iterable[papis.document.Document]) -> Iterator[str]:
+    """Export documents to yaml one by one, as ``yaml.dump_all`` would.
+    """
+    for i, document in enumerate(documents):
+        yield str(yaml.dump(
+            papis.document.to_dict(document),
+            Dumper=Dumper,
+            allow_unicode=True,
+            explicit_start=bool(i)))
+
+
+def get_parse_cache_path(yaml_path: str) -> str:
+    """Get the path of the file where the parsed data of a yaml file is
+    kept, see :ref:`info-parse-cache <config-settings-info-parse-cache>`.
+
+    :param yaml_path: Path to a yaml file
+    :type  yaml_path: str
+    :returns: Path in the cache directory
+    :rtype:  str
+    """
+    key = hashlib.sha1(os.path.abspath(yaml_path).encode()).hexdigest()
+    return os.path.join(
+        papis.utils.get_cache_home(), 'info', key[:2], key[2:])
+
+
+def _get_stat(path: str) -> Tuple[int, int, int]:
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _read_parse_cache(
+        cache_path: str,
+        stat: Tuple[int, int, int]) -> Optional[Dict[str, Any]]:
+    try:
+        with open(cache_path, 'rb') as fd:
+            cached_stat, data = pickle.load(fd)
+    except Exception:
+        return None
+    return data if cached_stat == stat and isinstance(data, dict) else None
+
+
+def _write_parse_cache(
+        cache_path: str,
+        stat: Tuple[int, int, int],
+        data: Dict[str, Any]) -> None:
+    tmp_path = '{0}.{1}'.format(cache_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'wb') as fd:
+            pickle.dump((stat, data), fd, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.debug("Could not cache '{0}': {1}".format(cache_path, e))
 
 
 def yaml_to_data(
         yaml_path: str,
         raise_exception: bool = False) -> Dict[str, Any]:
     """
-    Convert a yaml file into a dictionary using the yaml module.
+    Convert a yaml file into a dictionary using the yaml module, with
+    libyaml if it is available. If the ``info-parse-cache`` setting is
+    on, the data of files that did not change since they were last
+    parsed is read from the cache instead.
 
     :param yaml_path: Path to a yaml file
     :type  yaml_path: str
@@ -49,9 +153,16 @@ def yaml_to_data(
     :raises ValueError: If a yaml parsing error happens
     """
     global logger
+    cache_path = None  # type: Optional[str]
+    if papis.config.getboolean('info-parse-cache'):
+        cache_path = get_parse_cache_path(yaml_path)
+        stat = _get_stat(yaml_path)
+        cached = _read_parse_cache(cache_path, stat)
+        if cached is not None:
+            return cached
     with open(yaml_path) as fd:
         try:
-            data = yaml.safe_load(fd)
+            data = yaml.load(fd, Loader=SafeLoader)
         except Exception as e:
             if raise_exception:
                 raise ValueError(e)
@@ -59,7 +170,9 @@ def yaml_to_data(
             return dict()
         else:
             assert isinstance(data, dict)
-            return data
+    if cache_path is not None:
+        _write_parse_cache(cache_path, stat, data)
+    return data
 
 
 @click.command('yaml')
@@ -78,7 +191,7 @@ def explorer(ctx: click.Context, yamlfile: str) -> None:
     logger = logging.getLogger('explore:yaml')
     logger.info('reading in yaml file {}'.format(yamlfile))
     docs = [papis.document.from_data(d)
-            for d in yaml.safe_load_all(open(yamlfile))]
+            for d in yaml.load_all(open(yamlfile), Loader=SafeLoader)]
     ctx.obj['documents'] += docs
     logger.info('{} documents found'.format(len(docs)))
 
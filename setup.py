@@ -164,6 +164,7 @@ setup(
             "addto=papis.commands.addto:cli",
             "browse=papis.commands.browse:cli",
             "config=papis.commands.config:cli",
+            "daemon=papis.commands.daemon:cli",
             "edit=papis.commands.edit:cli",
             "explore=papis.commands.explore:cli",
             "export=papis.commands.export:cli",
@@ -176,6 +177,7 @@ setup(
             "rm=papis.commands.rm:cli",
             "run=papis.commands.run:cli",
             "update=papis.commands.update:cli",
+            "watch=papis.commands.watch:cli",
         ],
         'papis.downloader': [
             "acs=papis.downloaders.acs:Downloader",
@@ -109,6 +109,15 @@ class TestCli(tests.cli.TestCli):
             assert(data is not None)
             assert(re.match(r'.*Krishnamurti.*', data['author']) is not None)
 
+    def test_all(self):
+        result = self.invoke(['--all', '--format', 'json'])
+        self.assertTrue(result.exit_code == 0)
+        data = json.loads(result.stdout_bytes.decode())
+        self.assertEqual(
+            len(data), len(papis.database.get().get_all_documents()))
+        for d in data:
+            self.assertTrue(os.path.exists(d['_papis_local_folder']))
+
     def test_folder(self):
         outdir = tempfile.mktemp()
         self.assertTrue(not os.path.exists(outdir))
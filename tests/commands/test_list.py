@@ -1,9 +1,11 @@
 import os
 import unittest
+from unittest.mock import patch
 import tests
+import tests.cli
 import papis.config
 import papis.database
-from papis.commands.list import run
+from papis.commands.list import run, cli
 
 
 class Test(unittest.TestCase):
@@ -38,3 +40,43 @@ class Test(unittest.TestCase):
         assert(isinstance(folders, list))
         for f in folders:
             assert(os.path.exists(f))
+
+
+class TestCli(tests.cli.TestCli):
+
+    cli = cli
+
+    def test_main(self):
+        self.do_test_cli_function_exists()
+        self.do_test_help()
+
+    def test_all(self):
+        db = papis.database.get()
+        folders = sorted(
+            d.get_main_folder() for d in db.get_all_documents())
+        # the documents are streamed, without building the list of all of
+        # them first
+        with patch.object(db, 'query', side_effect=AssertionError):
+            result = self.invoke(['--all', '--dir'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(sorted(result.output.splitlines()), folders)
+
+        result = self.invoke(['--all', '__no_document__'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, '')
+
+    def test_limit(self):
+        db = papis.database.get()
+        folders = sorted(
+            d.get_main_folder() for d in db.get_all_documents())
+        result = self.invoke(['--all', '--limit', '2'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(len(result.output.splitlines()), 2)
+        self.assertTrue(set(result.output.splitlines()) <= set(folders))
+
+        result = self.invoke(['--all', '--limit', '2', '--sort', 'title'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(
+            result.output.splitlines(),
+            [d.get_main_folder() for d in sorted(
+                db.get_all_documents(), key=lambda d: d['title'])][:2])
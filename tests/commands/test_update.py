@@ -29,6 +29,19 @@ class Test(unittest.TestCase):
         db = papis.database.get()
         return db.get_all_documents()
 
+    def test_data_saved_outside(self):
+        db = papis.database.get()
+        doc = self.get_docs()[0]
+        # the database knows the old tags
+        db.query_dict(dict(tags='test_data_saved_outside'))
+        # the info file is edited behind the back of the database
+        edited = papis.document.from_folder(doc.get_main_folder())
+        edited['tags'] = 'test_data_saved_outside'
+        edited.save()
+        run(doc, data=dict(tags='test_data_saved_outside'))
+        docs = db.query_dict(dict(tags='test_data_saved_outside'))
+        self.assertEqual(len(docs), 1)
+
     def test_data(self):
         db = papis.database.get()
         docs = self.get_docs()
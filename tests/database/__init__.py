@@ -65,6 +65,115 @@ class DatabaseTest(unittest.TestCase):
         )
         self.assertTrue(len(docs) == 1)
 
+    def test_find_by_key(self):
+        database = papis.database.get()
+        doc = database.get_all_documents()[0]
+        doc['doi'] = '10.1234/test_find_by_key'
+        doc.save()
+        database.update(doc)
+        docs = database.find_by_key('doi', ' 10.1234/TEST_FIND_BY_KEY')
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0].get_main_folder(), doc.get_main_folder())
+
+        doc['doi'] = '10.1234/test_find_by_key_updated'
+        doc.save()
+        database.update(doc)
+        self.assertEqual(
+            database.find_by_key('doi', '10.1234/test_find_by_key'), [])
+        self.assertEqual(
+            len(database.find_by_key(
+                'doi', '10.1234/test_find_by_key_updated')), 1)
+
+    def test_query_cache(self):
+        database = papis.database.get()
+        doc = database.get_all_documents()[0]
+        doc['title'] = 'test_query_cache'
+        doc.save()
+        database.update(doc)
+        docs = database.query_dict({'title': 'test_query_cache'})
+        self.assertEqual(len(docs), 1)
+        key = database.get_query_cache_key(' title:"test_query_cache"')
+        self.assertEqual(len(database.get_cached_query(key)), 1)
+        self.assertEqual(
+            [d.get_main_folder() for d in
+             database.query_dict({'title': 'test_query_cache'})],
+            [d.get_main_folder() for d in docs])
+
+        doc['title'] = 'test_query_cache changed'
+        doc.save()
+        database.update(doc)
+        self.assertFalse(database.query_cache)
+        self.assertEqual(
+            len(database.query_dict({'title': 'test_query_cache'})),
+            len(database.query_dict({'title': 'changed'})))
+
+    def test_update_many(self):
+        database = papis.database.get()
+        N = len(database.get_all_documents())
+        docs = database.get_all_documents()[:3]
+        for i, doc in enumerate(docs):
+            doc['title'] = 'test_update_many {0}'.format(i)
+            doc.save()
+        database.update_many(docs)
+        self.assertEqual(
+            len(database.query_dict({'title': 'test_update_many'})), 3)
+        self.assertEqual(len(database.get_all_documents()), N)
+
+    def test_query_page(self):
+        database = papis.database.get()
+        query = database.get_all_query_string()
+        docs = database.query(query)
+        for limit, offset, reverse in [(3, 0, False), (2, 2, False),
+                                       (None, 1, False), (4, 0, True)]:
+            expected = papis.document.sort(docs, 'year', reverse)[offset:]
+            if limit is not None:
+                expected = expected[:limit]
+            page = database.query(query, limit=limit, offset=offset,
+                                  sort_key='year', reverse=reverse)
+            self.assertEqual(
+                [d.get_main_folder() for d in page],
+                [d.get_main_folder() for d in expected])
+        page = database.query(query, limit=2, offset=1)
+        self.assertEqual(
+            [d.get_main_folder() for d in page],
+            [d.get_main_folder() for d in docs[1:3]])
+
+    def test_iter_query(self):
+        database = papis.database.get()
+        doc = database.get_all_documents()[0]
+        doc['title'] = 'test_iter_query'
+        doc.save()
+        database.update(doc)
+        for query in [database.get_all_query_string(),
+                      'title:test_iter_query']:
+            self.assertEqual(
+                [d.get_main_folder() for d in database.iter_query(query)],
+                [d.get_main_folder() for d in database.query(query)])
+        it = database.iter_query('title:test_iter_query')
+        self.assertEqual(next(it)['title'], 'test_iter_query')
+        self.assertEqual(next(it, None), None)
+        for query in ['', database.get_all_query_string()]:
+            self.assertEqual(
+                [d.get_main_folder()
+                 for d in papis.api.iter_documents(search=query)],
+                [d.get_main_folder()
+                 for d in papis.api.get_documents_in_lib(search=query)])
+
+    def test_count(self):
+        database = papis.database.get()
+        doc = database.get_all_documents()[0]
+        doc['title'] = 'test_count'
+        doc.save()
+        database.update(doc)
+        for query in [database.get_all_query_string(), 'title:test_count',
+                      'title:__no_document__']:
+            expected = len(database.query(query))
+            self.assertEqual(database.count(query), expected)
+            self.assertEqual(database.exists(query), expected > 0)
+            database.bump_generation()
+            self.assertEqual(database.count(query), expected)
+            self.assertEqual(database.exists(query), expected > 0)
+
     def test_delete(self):
         database = papis.database.get()
         docs = database.get_all_documents()
@@ -1,7 +1,13 @@
 import os
+import pickle
+import shutil
+from unittest.mock import patch
 import tests.database
 import papis.config
 import papis.database
+import papis.database.cache
+import papis.document
+import papis.utils
 from papis.database.cache import filter_documents
 
 class Test(tests.database.DatabaseTest):
@@ -43,9 +49,190 @@ class Test(tests.database.DatabaseTest):
         else:
             self.assertTrue(False)
 
+    def test_folder_index(self):
+        db = papis.database.get()
+        docs = db.get_documents()
+        db.delete(docs[len(docs) // 2])
+        db.update(docs[-1])
+        for i, doc in enumerate(db.get_documents()):
+            self.assertEqual(db._locate_document(doc), [(i, doc)])
+        self.assertEqual(len(db.folder_index), len(db.get_documents()))
+
+    def test_match_strings(self):
+        db = papis.database.get()
+        doc = db.get_documents()[0]
+        default = papis.config.get_default_settings()['settings']
+        papis.config.set('match-format', '{doc[title]}')
+        try:
+            doc['title'] = 'Test_Match_Strings'
+            doc.save()
+            db.update(doc)
+            self.assertEqual(db.get_match_string(doc), 'test_match_strings')
+            self.assertEqual(len(db.query('match_str')), 1)
+            self.assertEqual(len(db.query('title:match_str')), 1)
+
+            # the strings survive reloading the cache
+            db.save()
+            db.documents = None
+            self.assertEqual(len(db.query('match_str')), 1)
+            self.assertTrue(db.match_strings)
+
+            papis.config.set('match-format', '{doc[author]}')
+            self.assertEqual(
+                db.get_match_string(doc), str(doc['author']).lower())
+            self.assertEqual(len(db.query('match_str')), 0)
+        finally:
+            papis.config.set('match-format', default['match-format'])
+
+    def test_trigram_index(self):
+        db = papis.database.get()
+        queries = ['einstein', 'ein 19', 'author:a ein', 'e', 'zzzzz', 'the']
+        db.trigram_index = None
+        expected = {q: db.query(q) for q in queries}
+        db.bump_generation()
+        with patch('papis.database.cache.TRIGRAM_INDEX_MIN_DOCUMENTS', 0), \
+                patch('papis.database.cache.TRIGRAM_INDEX_MIN_QUERIES', 0):
+            for q in queries:
+                self.assertEqual(db.query(q), expected[q], q)
+            self.assertTrue(db.trigram_index is not None)
+            self.assertEqual(len(db.trigram_index), len(db.get_documents()))
+
+            doc = db.get_documents()[0]
+            doc['title'] = 'Test_Trigram_Index'
+            doc.save()
+            db.update(doc)
+            self.assertEqual(db.query('trigram_ind'), [doc])
+
+    def test_revalidate(self):
+        db = papis.database.get()
+        docs = db.get_documents()
+        changed, removed = docs[0], docs[1]
+
+        # Modify the library behind the back of the database
+        changed['title'] = 'test_revalidate changed'
+        changed.save()
+        shutil.rmtree(removed.get_main_folder())
+        new = papis.document.from_data({'title': 'test_revalidate new'})
+        folder = os.path.join(db.get_dirs()[0], 'test_revalidate')
+        os.makedirs(folder)
+        new.set_folder(folder)
+        new.save()
+
+        papis.config.set('cache-revalidate', True)
+        try:
+            db.documents = None
+            docs = db.get_documents()
+        finally:
+            papis.config.set('cache-revalidate', False)
+
+        # Other tests remove documents only from the cache, so the folders
+        # on disk are the reference
+        Ni = len(papis.utils.get_folders(db.get_dirs()[0]))
+        self.assertEqual(len(docs), Ni)
+        folders = [d.get_main_folder() for d in docs]
+        self.assertTrue(folder in folders)
+        self.assertTrue(removed.get_main_folder() not in folders)
+        self.assertEqual(
+            len(db.query_dict({'title': 'test_revalidate changed'})), 1)
+
+        # the revalidated cache has been saved again
+        db.documents = None
+        self.assertEqual(len(db.get_documents()), Ni)
+
+    def test_clear(self):
+        db = papis.database.get()
+        db.get_documents()
+        new = papis.document.from_data({'title': 'test_clear new'})
+        folder = os.path.join(db.get_dirs()[0], 'test_clear')
+        os.makedirs(folder)
+        new.set_folder(folder)
+        new.save()
+        self.assertEqual(len(db.query_dict({'title': 'test_clear new'})), 0)
+
+        # the documents kept in memory are not written back either
+        db.clear()
+        self.assertEqual(len(db.query_dict({'title': 'test_clear new'})), 1)
+        self.assertEqual(
+            len(db.get_documents()),
+            len(papis.utils.get_folders(db.get_dirs()[0])))
+
+    def test_cache_version(self):
+        db = papis.database.get()
+        Ni = len(papis.utils.get_folders(db.get_dirs()[0]))
+        for snapshot in [db.get_documents()[:1],
+                         dict(db._get_snapshot(), version=1)]:
+            snapshot = pickle.loads(pickle.dumps(snapshot))
+            if isinstance(snapshot, dict):
+                snapshot["documents"] = snapshot["documents"][:1]
+            with open(db._get_cache_file_path(), 'wb') as fd:
+                pickle.dump(snapshot, fd)
+            # the library is indexed again and the cache written again
+            db.documents = None
+            self.assertEqual(len(db.get_documents()), Ni)
+            db.documents = None
+            self.assertEqual(len(db.get_documents()), Ni)
+
+    def test_iter_query_streams(self):
+        db = papis.database.get()
+        docs = db.get_documents()
+        db._invalidate_match_strings(docs[0].get_main_folder())
+        self.assertEqual(db.columns, dict())
+        with patch.object(db, 'get_match_string',
+                          wraps=db.get_match_string) as get_match_string:
+            self.assertTrue(db.exists('. .'))
+            next(db.iter_query('author:.'))
+        # only the first document was matched, without building columns
+        self.assertEqual(get_match_string.call_count, 3)
+        self.assertEqual(db.columns, dict())
+
+    def test_journal(self):
+        db = papis.database.get()
+        cache_path = db._get_cache_file_path()
+        journal_path = papis.database.cache.get_journal_file_path(cache_path)
+        db.save()
+        self.assertFalse(os.path.exists(journal_path))
+
+        doc = db.get_documents()[0]
+        doc['title'] = 'test_journal'
+        doc.save()
+        db.update(doc)
+        self.assertTrue(os.path.exists(journal_path))
+
+        # the snapshot is not aware of the update, but the journal is
+        db.documents = None
+        self.assertEqual(len(db.query_dict({'title': 'test_journal'})), 1)
+
+        papis.config.set('cache-journal-max-size', 0)
+        try:
+            db.delete(doc)
+        finally:
+            papis.config.set('cache-journal-max-size', 4194304)
+        self.assertFalse(os.path.exists(journal_path))
+        db.documents = None
+        self.assertEqual(len(db.query_dict({'title': 'test_journal'})), 0)
+
 
 def test_filter_documents():
     document = papis.document.from_data({'author': 'einstein'})
     assert len(filter_documents([document], search="einstein")) == 1
     assert len(filter_documents([document], search="author : ein")) == 1
     assert len(filter_documents([document], search="title : ein")) != 1
+
+
+@patch('multiprocessing.cpu_count', lambda: 2)
+def test_match_strings_parallel():
+    import papis.database.cache as cache
+    strings = ['document {0}'.format(i) for i in range(1000)]
+    regex = cache.get_regex_from_search('ment 1')
+    expected = cache._match_strings((strings, 0, regex))
+    min_parallel_match = cache.MIN_PARALLEL_MATCH
+    has_shared_memory = cache.HAS_SHARED_MEMORY
+    cache.MIN_PARALLEL_MATCH = 0
+    try:
+        assert cache.match_strings(strings, regex) == expected
+        cache.HAS_SHARED_MEMORY = False
+        assert cache.match_strings(strings, regex) == expected
+    finally:
+        cache.MIN_PARALLEL_MATCH = min_parallel_match
+        cache.HAS_SHARED_MEMORY = has_shared_memory
+    assert expected
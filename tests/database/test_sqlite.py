@@ -0,0 +1,46 @@
+import tests.database
+import papis.config
+import papis.database
+import papis.database.sqlite
+
+
+class Test(tests.database.DatabaseTest):
+
+    @classmethod
+    def setUpClass(cls):
+        papis.config.set('database-backend', 'sqlite')
+        tests.database.DatabaseTest.setUpClass()
+
+    def test_backend_name(self):
+        self.assertTrue(papis.config.get('database-backend') == 'sqlite')
+        self.assertTrue(papis.database.get().get_backend_name() == 'sqlite')
+
+    def test_query(self):
+        database = papis.database.get()
+        docs = database.query('.')
+        self.assertTrue(len(docs) > 0)
+        for doc in docs:
+            self.assertTrue(doc.get_main_folder() is not None)
+
+    def test_query_language(self):
+        database = papis.database.get()
+        docs = database.get_all_documents()
+        for query in ['einstein', 'author : a', 'ein 19', 'year:19 e',
+                      'title:"the"', 'nonexistingauthorname']:
+            compiled = papis.docmatcher.compile_query(query)
+            expected = [d.get_main_folder() for d in compiled.filter(docs)]
+            found = [d.get_main_folder() for d in database.query(query)]
+            self.assertEqual(sorted(found), sorted(expected), query)
+
+    def test_match_format_change(self):
+        database = papis.database.get()
+        papis.config.set('match-format', '{doc[year]}')
+        try:
+            database.render_match_strings()
+            docs = database.query('zzzzzzz')
+            self.assertEqual(len(docs), 0)
+        finally:
+            papis.config.set('match-format',
+                             papis.config.get_default_settings()[
+                                 'settings']['match-format'])
+            database.render_match_strings()
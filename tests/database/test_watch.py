@@ -0,0 +1,144 @@
+import errno
+import os
+import shutil
+import unittest
+import tests
+import papis.config
+import papis.database
+import papis.document
+from papis.database.watch import Watcher
+
+
+class Test(unittest.TestCase):
+
+    backend = 'papis'
+
+    @classmethod
+    def setUpClass(cls):
+        tests.setup_test_library()
+        papis.config.set('database-backend', cls.backend)
+
+    @classmethod
+    def tearDownClass(cls):
+        papis.config.set('database-backend', 'papis')
+
+    def setUp(self):
+        self.db = papis.database.get()
+        self.watcher = Watcher(self.db, delay=0)
+
+    def tearDown(self):
+        self.watcher.close()
+
+    def wait(self):
+        while self.watcher.poll(0.1):
+            pass
+        self.watcher.flush()
+
+    def test_changes(self):
+        db = self.db
+        docs = db.get_all_documents()
+        changed, removed = docs[0], docs[1]
+
+        changed['title'] = 'test_watch changed'
+        changed.save()
+        shutil.rmtree(removed.get_main_folder())
+        new = papis.document.from_data({'title': 'test_watch new'})
+        folder = os.path.join(db.get_dirs()[0], 'test_watch', 'new')
+        os.makedirs(folder)
+        new.set_folder(folder)
+        new.save()
+        self.wait()
+
+        self.assertEqual(db.count('title:test_watch'), 2)
+        folders = [d.get_main_folder() for d in db.get_all_documents()]
+        self.assertTrue(folder in folders)
+        self.assertTrue(removed.get_main_folder() not in folders)
+
+        # moving a folder deletes and adds the documents in it
+        moved = os.path.join(db.get_dirs()[0], 'test_watch_moved')
+        os.rename(os.path.dirname(folder), moved)
+        self.wait()
+        self.assertEqual(
+            [d.get_main_folder()
+             for d in db.query_dict({'title': 'test_watch new'})],
+            [os.path.join(moved, 'new')])
+
+    def test_catch_up(self):
+        self.watcher.close()
+        folder = os.path.join(self.db.get_dirs()[0], 'test_watch_catch_up')
+        os.makedirs(folder)
+        doc = papis.document.from_data({'title': 'test_catch_up'})
+        doc.set_folder(folder)
+        doc.save()
+
+        self.watcher = Watcher(self.db, delay=0)
+        self.assertEqual(self.watcher.pending, set([folder]))
+        self.watcher.flush()
+        self.assertTrue(self.db.exists('title:test_catch_up'))
+
+    def test_database_changes(self):
+        # changes made through the database are seen by the watcher too
+        db = self.db
+        self.wait()
+        docs = db.get_all_documents()
+        count = len(docs)
+        removed, changed = docs[-1], docs[-2]
+        folder = os.path.join(db.get_dirs()[0], 'test_database_changes')
+        os.makedirs(folder)
+        added = papis.document.from_data({'title': 'test_database_added'})
+        added.set_folder(folder)
+        added.save()
+        db.add(added)
+
+        shutil.rmtree(removed.get_main_folder())
+        db.delete(removed)
+
+        changed['title'] = 'test_database_changed'
+        changed.save()
+        self.wait()
+
+        self.assertEqual(len(db.get_all_documents()), count)
+        self.assertEqual(db.count('title:test_database_added'), 1)
+        self.assertEqual(db.count('title:test_database_changed'), 1)
+        self.assertTrue(removed.get_main_folder() not in [
+            d.get_main_folder() for d in db.get_all_documents()])
+
+    def test_crawl_rules(self):
+        # folders that are not crawled are not watched either
+        self.watcher.close()
+        papis.config.set('crawl-ignore', "['test_watch_ignored*']")
+        papis.config.set('crawl-nested-documents', False)
+        try:
+            self.watcher = Watcher(self.db, delay=0)
+        finally:
+            papis.config.set('crawl-ignore', "['.git']")
+            papis.config.set('crawl-nested-documents', True)
+        libdir = self.db.get_dirs()[0]
+        parent = self.db.get_all_documents()[0].get_main_folder()
+        self.assertTrue(parent in self.watcher.paths.values())
+        for folder in [os.path.join(libdir, 'test_watch_ignored', 'doc'),
+                       os.path.join(parent, 'test_watch_nested')]:
+            os.makedirs(folder)
+            doc = papis.document.from_data({'title': 'test_crawl_rules'})
+            doc.set_folder(folder)
+            doc.save()
+        self.wait()
+        self.assertFalse(self.db.exists('title:test_crawl_rules'))
+        shutil.rmtree(os.path.join(libdir, 'test_watch_ignored'))
+        shutil.rmtree(os.path.join(parent, 'test_watch_nested'))
+
+    def test_watch_limit(self):
+        # running out of inotify watches is only reported once
+        def add_watch(path, mask):
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+
+        self.watcher.inotify.add_watch = add_watch
+        with self.assertLogs('database:watch', 'WARNING') as logs:
+            self.watcher.watch_tree(self.db.get_dirs()[0])
+            self.watcher.watch_tree(self.db.get_dirs()[0])
+        self.assertEqual(len(logs.output), 1)
+
+
+class WhooshTest(Test):
+
+    backend = 'whoosh'
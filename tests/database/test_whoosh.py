@@ -1,6 +1,12 @@
+import os
+from unittest.mock import patch
+import tests
 import tests.database
 import papis.config
 import papis.database
+import papis.document
+import papis.database.whoosh
+import papis.utils
 
 class Test(tests.database.DatabaseTest):
 
@@ -18,3 +24,97 @@ class Test(tests.database.DatabaseTest):
         database = papis.database.get()
         docs = database.query('*')
         self.assertTrue(len(docs) > 0)
+
+    def test_lazy_documents(self):
+        database = papis.database.get()
+        docs = database.query('*')
+        self.assertTrue(len(docs) > 0)
+        for doc in docs:
+            self.assertTrue(isinstance(doc, papis.document.LazyDocument))
+            self.assertFalse(doc.is_loaded())
+            self.assertTrue(doc.get_main_folder() is not None)
+        doc = docs[0]
+        fresh = papis.document.from_folder(doc.get_main_folder())
+        self.assertEqual(doc['title'], fresh['title'])
+        self.assertFalse(doc.is_loaded())
+        self.assertEqual(papis.document.to_dict(doc),
+                         papis.document.to_dict(fresh))
+        self.assertTrue(doc.is_loaded())
+
+    def test_reuse_searcher(self):
+        database = papis.database.get()
+        database.query('*')
+        searcher = database.get_searcher()
+        parser = database.get_parser()
+        database.bump_generation()
+        database.query('*')
+        self.assertTrue(database.get_searcher() is searcher)
+        self.assertTrue(database.get_parser() is parser)
+
+        # another database object changes the index behind our back
+        other = papis.database.whoosh.Database(database.lib)
+        doc = database.get_all_documents()[0]
+        doc['title'] = 'test_reuse_searcher'
+        doc.save()
+        other.update(doc)
+        docs = database.query_dict({'title': 'test_reuse_searcher'})
+        self.assertEqual(len(docs), 1)
+        self.assertTrue(database.get_searcher() is not searcher)
+        other.close()
+
+    @patch('multiprocessing.cpu_count', lambda: 2)
+    @patch('papis.database.whoosh.MIN_PARALLEL_INDEXING', 0)
+    def test_add_many_parallel(self):
+        database = papis.database.get()
+        N = len(database.get_all_documents())
+        newdocs = []
+        for j, data in enumerate(tests.test_data):
+            doc = papis.document.from_data(data)
+            doc['title'] = 'test_add_many {0}'.format(j)
+            doc.set_folder(os.path.join(
+                database.get_dirs()[0], 'add_many', str(j)))
+            os.makedirs(doc.get_main_folder())
+            doc.save()
+            newdocs.append(doc)
+        database.add_many(newdocs)
+        self.assertEqual(len(database.get_all_documents()), N + len(newdocs))
+        self.assertEqual(
+            len(database.query_dict({'title': 'test_add_many'})),
+            len(newdocs))
+
+    def test_migrate(self):
+        database = papis.database.get()
+        N = len(database.get_all_documents())
+        doc = database.get_all_documents()[0]
+        doc['title'] = 'test_migrate'
+        doc.save()
+
+        read_folders = []
+
+        def folders_to_documents(folders):
+            read_folders.extend(folders)
+            return papis.utils.folders_to_documents(folders)
+
+        default = papis.config.get('whoosh-schema-fields')
+        with patch('papis.database.whoosh.folders_to_documents',
+                   folders_to_documents):
+            # removing fields only needs the values stored in the index,
+            # except for the documents changed behind its back
+            papis.config.set('whoosh-schema-fields', "[]")
+            try:
+                migrated = papis.database.whoosh.Database(database.lib)
+                self.assertEqual(read_folders, [doc.get_main_folder()])
+                self.assertFalse('doi' in migrated.get_schema().names())
+                self.assertEqual(len(migrated.get_all_documents()), N)
+                self.assertEqual(
+                    len(migrated.query_dict({'title': 'test_migrate'})), 1)
+            finally:
+                papis.config.set('whoosh-schema-fields', default)
+
+            # new fields need all info files
+            read_folders.clear()
+            migrated = papis.database.whoosh.Database(database.lib)
+            self.assertEqual(len(read_folders), N)
+            self.assertTrue('doi' in migrated.get_schema().names())
+            self.assertEqual(len(migrated.get_all_documents()), N)
+        migrated.close()
@@ -0,0 +1,232 @@
+import datetime
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import tests
+import papis.config
+import papis.daemon
+import papis.database
+import papis.document
+import papis.format
+import papis.parallel
+
+
+class Test(unittest.TestCase):
+
+    backend = 'papis'
+
+    @classmethod
+    def setUpClass(cls):
+        tests.setup_test_library()
+        papis.config.set('database-backend', cls.backend)
+        cls.path = os.path.join(tempfile.mkdtemp(), 'daemon.sock')
+        cls.server = papis.daemon.Server(cls.path)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+        papis.config.set('use-daemon', True)
+        papis.config.set('database-backend', 'papis')
+
+    def setUp(self):
+        self.client = papis.daemon.connect(self.path)
+        self.assertTrue(self.client is not None)
+        self.db = papis.daemon.RemoteDatabase(self.client)
+        self.local = papis.database.get()
+
+    def tearDown(self):
+        self.client.close()
+
+    def folders(self, docs):
+        return [d.get_main_folder() for d in docs]
+
+    def test_query(self):
+        self.assertEqual(
+            self.db.get_backend_name(), self.local.get_backend_name())
+        for query in [self.db.get_all_query_string(), 'krishnamurti']:
+            self.assertEqual(
+                self.folders(self.db.query(query)),
+                self.folders(self.local.query(query)))
+            self.assertEqual(self.db.count(query), self.local.count(query))
+        doc = self.db.query('krishnamurti')[0]
+        self.assertTrue(isinstance(doc, papis.document.Document))
+        self.assertEqual(
+            doc['author'], self.local.query('krishnamurti')[0]['author'])
+        self.assertFalse(self.db.exists('__no_document__'))
+        self.assertEqual(
+            self.db.format('{doc[author]}', 'krishnamurti'),
+            [doc['author']])
+
+    def test_update(self):
+        doc = self.db.get_all_documents()[0]
+        doc['title'] = 'test_daemon_update'
+        doc.save()
+        self.db.update(doc)
+        self.assertEqual(
+            self.folders(self.db.query_dict({'title': 'test_daemon_update'})),
+            [doc.get_main_folder()])
+
+    def test_settings(self):
+        request = {
+            'command': 'query',
+            'library': papis.config.get_lib_name(),
+            'paths': papis.config.get_lib().paths,
+            'args': ['krishnamurti'],
+        }
+        self.assertEqual(len(self.server.execute(request)), 1)
+        request['settings'] = {
+            'match-format': '{doc[year]}', 'format-doc-name': None}
+        self.assertEqual(self.server.execute(request), [])
+        self.assertEqual(
+            papis.config.get('match-format'),
+            papis.config.get_default_settings()['settings']['match-format'])
+
+        request['command'] = 'format'
+        request['args'] = ['{{doc["author"]}}', 'krishnamurti']
+        request['settings'] = {
+            'formater': 'jinja2', 'match-format': '{{doc["author"]}}'}
+        self.assertEqual(self.server.execute(request), ['J. Krishnamurti'])
+        self.assertTrue(isinstance(
+            papis.format.get_formater(), papis.format.PythonFormater))
+
+    def test_watcher(self):
+        # changes made through the daemon are not applied again by the
+        # watcher of its database
+        if not self.server.watchers:
+            self.skipTest("no inotify")
+        watcher = self.server.watchers[0]
+        watcher.stop()
+        try:
+            docs = self.db.get_all_documents()
+            count = len(docs)
+            removed, changed = docs[-1], docs[-2]
+            folder = os.path.join(self.db.get_dirs()[0], 'test_watcher')
+            os.makedirs(folder)
+            added = papis.document.from_data({'title': 'test_watcher'})
+            added.set_folder(folder)
+            added.save()
+            self.db.add(added)
+            shutil.rmtree(removed.get_main_folder())
+            self.db.delete(removed)
+            changed['title'] = 'test_watcher changed'
+            changed.save()
+
+            while watcher.poll(0.1):
+                pass
+            watcher.flush()
+        finally:
+            watcher.start()
+        self.assertEqual(len(self.db.get_all_documents()), count)
+        self.assertEqual(self.db.count('title:test_watcher'), 2)
+        self.assertEqual(self.db.count('title:"test_watcher changed"'), 1)
+
+    def test_watcher_first(self):
+        # changes the watcher has already applied are not applied again
+        # when they are sent to the daemon
+        if not self.server.watchers:
+            self.skipTest("no inotify")
+        watcher = self.server.watchers[0]
+        watcher.stop()
+
+        def flush():
+            while watcher.poll(0.1):
+                pass
+            watcher.flush()
+
+        try:
+            count = len(self.db.get_all_documents())
+            folder = os.path.join(self.db.get_dirs()[0], 'test_watcher_first')
+            os.makedirs(folder)
+            added = papis.document.from_data({'title': 'test_watcher_first'})
+            added.set_folder(folder)
+            added.save()
+            flush()
+            self.db.add(added)
+            self.assertEqual(len(self.db.get_all_documents()), count + 1)
+            shutil.rmtree(folder)
+            flush()
+            self.db.delete(added)
+        finally:
+            watcher.start()
+        self.assertEqual(len(self.db.get_all_documents()), count)
+
+    def test_dates(self):
+        folder = os.path.join(self.db.get_dirs()[0], 'test_dates')
+        os.makedirs(folder)
+        doc = papis.document.from_data({
+            'title': 'test_dates',
+            'date': datetime.date(2020, 1, 1),
+            'modified': datetime.datetime(
+                2020, 1, 1, 12, 30, 5, 10,
+                tzinfo=datetime.timezone(datetime.timedelta(hours=2)))})
+        doc.set_folder(folder)
+        doc.save()
+        self.db.add(doc)
+
+        got = self.db.query_dict({'title': 'test_dates'})[0]
+        self.assertEqual(got['date'], doc['date'])
+        self.assertEqual(got['modified'], doc['modified'])
+        # saving the document does not turn its dates into strings
+        self.assertFalse(got.is_dirty())
+
+    def test_executor_kind(self):
+        # the threads of the daemon must not be forked
+        papis.config.set('parallel-executor', 'process')
+        try:
+            self.assertEqual(papis.parallel.get_executor_kind(), 'thread')
+        finally:
+            papis.config.set('parallel-executor', 'auto')
+
+    def test_error(self):
+        with self.assertRaises(Exception):
+            self.client.call('__no_command__', papis.config.get_lib())
+
+    def test_no_unix_sockets(self):
+        af_unix = socket.AF_UNIX
+        papis.config.set('use-daemon', True)
+        del socket.AF_UNIX
+        try:
+            self.assertTrue(
+                papis.database._connect_daemon(papis.config.get_lib())
+                is None)
+        finally:
+            socket.AF_UNIX = af_unix
+            papis.config.set('use-daemon', False)
+        with unittest.mock.patch.object(
+                papis.daemon, 'HAS_UNIX_SOCKETS', False):
+            self.assertTrue(papis.daemon.connect(self.path) is None)
+            with self.assertRaises(Exception):
+                papis.daemon.serve(self.path)
+
+    def test_fallback(self):
+        self.client.socket.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(
+            self.folders(self.db.get_all_documents()),
+            self.folders(self.local.get_all_documents()))
+        self.assertTrue(self.db.local is not None)
+
+
+class SqliteTest(Test):
+
+    backend = 'sqlite'
+
+    def test_threads(self):
+        # every connection is answered by a thread of its own
+        self.assertEqual(self.db.count('krishnamurti'), 1)
+        client = papis.daemon.connect(self.path)
+        try:
+            db = papis.daemon.RemoteDatabase(client)
+            self.assertEqual(db.count('popper'), 1)
+            self.assertEqual(
+                self.folders(db.query('popper')),
+                self.folders(self.local.query('popper')))
+        finally:
+            client.close()
@@ -52,3 +52,30 @@ def test_parse_query():
     assert(r[1][0] == 'author')
     assert(r[1][1] == ':')
     assert(r[1][2] == 'Albert einstein')
+
+
+def test_compiled_query():
+    import pickle
+    import papis.document
+    from concurrent.futures import ThreadPoolExecutor
+    from papis.docmatcher import CompiledQuery, compile_query
+
+    docs = [papis.document.from_data(d) for d in get_docs()]
+    query = CompiledQuery('author : seitz', '{doc[title]}', 'doc')
+    assert(len(query.clauses) == 1)
+    assert(query.clauses[0].key == 'author')
+    expected = query.filter(docs)
+    assert(len(expected) == 1)
+    assert(CompiledQuery('', '{doc[title]}', 'doc').filter(docs) == [])
+
+    # compiled queries can be sent to other processes
+    unpickled = pickle.loads(pickle.dumps(query))
+    assert(unpickled.filter(docs) == expected)
+
+    # and used from several threads at the same time
+    queries = [query, CompiledQuery('author : a')] * 8
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda q: len(q.filter(docs)), queries))
+    assert(results == [1, 12] * 8)
+
+    assert(compile_query('author:seitz') is compile_query('author:seitz'))
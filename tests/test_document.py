@@ -7,11 +7,13 @@ from papis.document import (
     Document,
     sort,
 )
+import papis.document
 import papis.format
 import tempfile
 import papis.config
 import pickle
 import os
+from unittest.mock import patch
 from tests import create_random_file, setup_test_library
 from tests import create_random_file, setup_test_library, create_real_document
 
@@ -148,6 +150,31 @@ def test_pickle() -> None:
     assert(gotdocs[1]['author'] == docs[1]['author'])
 
 
+def test_compact() -> None:
+    folder = os.path.join(os.path.dirname(__file__), 'resources', 'document')
+    docs = [papis.document.from_folder(folder) for _ in range(2)]
+    data = papis.document.to_dict(docs[0])
+    for doc in docs:
+        assert papis.document.compact(doc) is doc
+    assert papis.document.to_dict(docs[0]) == data
+    for key in data:
+        if isinstance(data[key], str) and len(data[key]) < 64:
+            assert docs[0][key] is docs[1][key]
+
+    # attributes can still be set on documents and are pickled with them
+    docs[0].note = 'hello'
+    gotdoc = pickle.loads(pickle.dumps(docs[0]))
+    assert gotdoc.note == 'hello'
+    assert gotdoc == docs[0]
+    assert gotdoc.get_info_file() == docs[0].get_info_file()
+    assert gotdoc.subfolder == docs[0].subfolder
+
+    lazy = papis.document.LazyDocument(folder, {'title': 'Known title'})
+    papis.document.compact(lazy)
+    assert not lazy.is_loaded()
+    assert not pickle.loads(pickle.dumps(lazy)).is_loaded()
+
+
 def test_sort() -> None:
     docs = [
         from_data(dict(title="Hello world", year=1990)),
@@ -155,3 +182,69 @@ def test_sort() -> None:
     ]
     sDocs = sort(docs, key="year", reverse=False)
     assert(sDocs[0] == docs[1])
+
+
+def test_lazy_document() -> None:
+    folder = os.path.join(os.path.dirname(__file__), 'resources', 'document')
+    doc = papis.document.LazyDocument(folder, {'title': 'Known title'})
+    assert doc['title'] == 'Known title'
+    assert not doc.is_loaded()
+    assert doc['author'] == 'Russell, Bertrand'
+    assert doc.is_loaded()
+    assert doc['title'] == from_folder(folder)['title']
+
+    doc = papis.document.LazyDocument(folder)
+    doc['title'] = 'New title'
+    assert doc.is_loaded()
+    assert doc['title'] == 'New title'
+    assert doc['author'] == 'Russell, Bertrand'
+
+    doc = papis.document.LazyDocument(folder)
+    assert to_json(doc) == to_json(from_folder(folder))
+    gotdoc = pickle.loads(pickle.dumps(papis.document.LazyDocument(folder)))
+    assert gotdoc['author'] == 'Russell, Bertrand'
+    assert papis.format.format('{doc[author]}',
+                               papis.document.LazyDocument(folder)) \
+        == 'Russell, Bertrand'
+
+
+def test_save() -> None:
+    folder = tempfile.mkdtemp()
+    doc = papis.document.from_data({'title': 'test_save'})
+    doc.set_folder(folder)
+    assert doc.is_dirty()
+    assert doc.save()
+    assert not doc.is_dirty()
+    os.chmod(doc.get_info_file(), 0o600)
+    mtime = os.stat(doc.get_info_file()).st_mtime_ns
+
+    # saving again does not write anything
+    assert not doc.save()
+    assert not from_folder(folder).save()
+    assert os.stat(doc.get_info_file()).st_mtime_ns == mtime
+
+    doc['author'] = 'someone'
+    assert doc.is_dirty()
+    assert doc.save()
+    assert from_folder(folder)['author'] == 'someone'
+    assert os.stat(doc.get_info_file()).st_mode & 0o777 == 0o600
+    assert os.listdir(folder) == [os.path.basename(doc.get_info_file())]
+
+
+def test_save_many() -> None:
+    docs = []
+    for i in range(5):
+        doc = papis.document.from_data({'title': 'test_save_many'})
+        doc.set_folder(tempfile.mkdtemp())
+        doc.save()
+        docs.append(doc)
+    docs[1]['title'] = 'changed 1'
+    docs[3]['title'] = 'changed 3'
+    with patch('os.fsync', wraps=os.fsync) as fsync:
+        assert papis.document.save_many(docs) == [docs[1], docs[3]]
+    # the two info files and their two folders
+    assert fsync.call_count == 4
+    assert [from_folder(d.get_main_folder())['title'] for d in docs] == [
+        'test_save_many', 'changed 1', 'test_save_many', 'changed 3',
+        'test_save_many']
+    assert papis.document.save_many(docs) == []
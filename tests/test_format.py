@@ -1,3 +1,4 @@
+import os
 import papis.document
 import papis.format
 import papis.config
@@ -17,3 +18,33 @@ def test_basic():
     assert(papis.format.format(
         '{doc[author]}{doc[title]}{doc[blahblah]}', dict(title='hell'))
         == 'hell')
+
+
+def test_compile():
+    setup_test_library()
+    document = papis.document.from_data(
+        dict(author='Fulano', title='Something'))
+
+    header = papis.format.compile('{doc[author]}{doc[title]}{doc[blahblah]}')
+    assert header(document) == 'FulanoSomething'
+    assert header(dict(title='hell')) == 'hell'
+
+    # documents are formatted as copies without a folder
+    document.set_folder(os.path.join(os.sep, 'srv', 'papers', 'einstein'))
+    document['tags'] = 'T'
+    assert papis.format.format('{doc[tags]}|{doc.subfolder}', document) == \
+        'T|'
+    assert 'papers' not in papis.format.format(
+        papis.config.getstring('match-format'), document)
+
+    papis.format._FORMATER = papis.format.Jinja2Formater()
+    try:
+        fmt = '{{doc["author"]}}{{doc["title"]}}{{doc["blahblah"]}}'
+        header = papis.format.compile(fmt)
+        assert header(document) == 'FulanoSomething'
+        assert papis.format.format(fmt, document) == 'FulanoSomething'
+        assert (papis.format._get_jinja2_template(fmt)
+                is papis.format._get_jinja2_template(fmt))
+        assert 'unexpected' in papis.format.format('{{doc[}}', document)
+    finally:
+        papis.format._FORMATER = None
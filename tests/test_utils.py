@@ -5,11 +5,12 @@ import tests
 from unittest.mock import patch
 import papis.commands.add
 import papis.database
+import papis.utils
 import papis.document
 from papis.document import from_data
 from papis.utils import (
     get_cache_home, create_identifier, locate_document,
-    general_open, clean_document_name,
+    general_open, clean_document_name, crawl_folders,
 )
 from papis.filetype import get_document_extension
 
@@ -127,3 +128,36 @@ def test_slugify():
     )
     assert(clean_document_name('масса и енергиа.pdf') == 'massa-i-energia.pdf')
     assert(clean_document_name('الامير الصغير.pdf') == 'lmyr-lsgyr.pdf')
+
+
+def test_crawl_folders():
+    root = tempfile.mkdtemp()
+    folders = ['a', 'b', os.path.join('b', 'nested'), os.path.join('c', 'd'),
+               os.path.join('.git', 'e')]
+    for folder in folders:
+        os.makedirs(os.path.join(root, folder))
+        with open(os.path.join(root, folder, 'info.yaml'), 'w') as fd:
+            fd.write('title: test')
+    expected = sorted(os.path.join(root, f) for f in folders[:4])
+    assert crawl_folders([root]) == expected
+    assert crawl_folders([root], workers=1) == expected
+    assert crawl_folders([root], nested=False) == [
+        f for f in expected if not f.endswith('nested')]
+    assert len(crawl_folders([root], ignore=[])) == 5
+    assert crawl_folders([os.path.join(root, 'b'), os.path.join(root, 'c')],
+                         ignore=['nes*']) == [
+        os.path.join(root, 'b'), os.path.join(root, 'c', 'd')]
+
+
+def test_folders_to_documents():
+    tests.setup_test_library()
+    folders = papis.utils.get_folders(papis.config.get_lib().paths[0])
+    expected = [papis.document.from_folder(f) for f in folders]
+    for kind in ['serial', 'thread', 'process']:
+        papis.config.set('parallel-executor', kind)
+        try:
+            docs = papis.utils.folders_to_documents(folders)
+        finally:
+            papis.config.set('parallel-executor', 'auto')
+        assert [d.get_main_folder() for d in docs] == folders
+        assert [dict(d) for d in docs] == [dict(d) for d in expected]
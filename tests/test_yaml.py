@@ -0,0 +1,61 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+from unittest.mock import patch
+import yaml
+import papis.config
+import papis.yaml
+
+
+def test_yaml_to_data():
+    path = os.path.join(tempfile.mkdtemp(), 'info.yaml')
+    data = {'title': 'Ökologie', 'year': 1935, 'tags': ['a', 'b']}
+    papis.yaml.data_to_yaml(path, data)
+    assert papis.yaml.yaml_to_data(path) == data
+
+
+def test_without_libyaml():
+    # pyyaml built without libyaml lacks the C loader and dumper
+    pure_yaml = types.ModuleType('yaml')
+    pure_yaml.__dict__.update(
+        (k, v) for k, v in vars(yaml).items()
+        if k not in ('CSafeLoader', 'CDumper'))
+    spec = importlib.util.spec_from_file_location(
+        'papis_yaml_without_libyaml', papis.yaml.__file__)
+    module = importlib.util.module_from_spec(spec)
+    with patch.dict(sys.modules, {'yaml': pure_yaml}):
+        spec.loader.exec_module(module)
+    assert module.SafeLoader is yaml.SafeLoader
+    assert module.Dumper is yaml.Dumper
+
+    path = os.path.join(tempfile.mkdtemp(), 'info.yaml')
+    data = {'title': 'Ökologie', 'year': 1935, 'tags': ['a', 'b']}
+    module.data_to_yaml(path, data)
+    assert module.yaml_to_data(path) == data
+    assert papis.yaml.yaml_to_data(path) == data
+    assert module.data_to_string(data) == papis.yaml.data_to_string(data)
+
+
+def test_parse_cache():
+    cache_home = tempfile.mkdtemp()
+    with patch.dict(os.environ, {'XDG_CACHE_HOME': cache_home}):
+        path = os.path.join(tempfile.mkdtemp(), 'info.yaml')
+        papis.yaml.data_to_yaml(path, {'title': 'cached'})
+        cache_path = papis.yaml.get_parse_cache_path(path)
+        assert cache_path.startswith(cache_home)
+        papis.config.set('info-parse-cache', True)
+        try:
+            assert papis.yaml.yaml_to_data(path) == {'title': 'cached'}
+            assert os.path.exists(cache_path)
+            assert papis.yaml.yaml_to_data(path) == {'title': 'cached'}
+
+            # a changed file is parsed again
+            papis.yaml.data_to_yaml(path, {'title': 'changed'})
+            assert papis.yaml.yaml_to_data(path) == {'title': 'changed'}
+            assert papis.yaml.yaml_to_data(path) == {'title': 'changed'}
+        finally:
+            papis.config.set('info-parse-cache', False)
+        assert not os.path.exists(cache_path + '.{0}'.format(os.getpid()))
+    assert os.environ.get('XDG_CACHE_HOME') != cache_home
@@ -0,0 +1,77 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Compare the ways of reading the info files of a synthetic library:
+#
+#   python tools/benchmark-yaml.py -n 2000
+
+import argparse
+import os
+import tempfile
+import time
+
+import yaml
+
+import papis.config
+import papis.yaml
+
+INFO = {
+    'author': 'Einstein, Albert and Podolsky, Boris and Rosen, Nathan',
+    'author_list': [
+        {'given': 'Albert', 'family': 'Einstein'},
+        {'given': 'Boris', 'family': 'Podolsky'},
+        {'given': 'Nathan', 'family': 'Rosen'}],
+    'title': 'Can Quantum-Mechanical Description of Physical Reality Be '
+             'Considered Complete? ({0})',
+    'journal': 'Physical Review',
+    'year': 1935,
+    'volume': 47,
+    'pages': '777--780',
+    'doi': '10.1103/PhysRev.47.{0}',
+    'files': ['paper.pdf'],
+    'tags': ['physics', 'quantum'],
+}
+
+
+def create_library(directory: str, size: int) -> list:
+    paths = []
+    for i in range(size):
+        folder = os.path.join(directory, str(i))
+        os.makedirs(folder)
+        data = dict(INFO, title=INFO['title'].format(i),
+                    doi=INFO['doi'].format(i))
+        path = os.path.join(folder, 'info.yaml')
+        papis.yaml.data_to_yaml(path, data)
+        paths.append(path)
+    return paths
+
+
+def run(name: str, paths: list, load) -> None:
+    begin = time.time()
+    for path in paths:
+        load(path)
+    delta = time.time() - begin
+    print("{0:<24} {1:8.1f} ms {2:8.1f} us/file".format(
+        name, 1000 * delta, 1e6 * delta / len(paths)))
+
+
+def safe_load(path: str) -> dict:
+    with open(path) as fd:
+        return yaml.load(fd, Loader=yaml.SafeLoader)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', help='Number of documents', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ['XDG_CACHE_HOME'] = tempfile.mkdtemp()
+    paths = create_library(tempfile.mkdtemp(), args.n)
+    print("libyaml available: {0}".format(yaml.__with_libyaml__))
+
+    run("pure python", paths, safe_load)
+    papis.config.set('info-parse-cache', False)
+    run("yaml_to_data", paths, papis.yaml.yaml_to_data)
+    papis.config.set('info-parse-cache', True)
+    run("parse cache (cold)", paths, papis.yaml.yaml_to_data)
+    run("parse cache (warm)", paths, papis.yaml.yaml_to_data)